@@ -0,0 +1,65 @@
+"""Run all benchmarks, and print the results as JSON (to track regressions
+across releases).
+
+Run from the repository root (Linux only, uses pseudo-terminals)::
+
+    python -m benchmarks [--quick] [--output results.json]
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+
+from . import codec, ports, stages
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr = subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick = False):
+    if quick:
+        codec_duration, port_counts, port_duration, reads = 0.01, (1, 4), 1, 50
+    else:
+        codec_duration, port_counts, port_duration, reads = 0.05, (1, 4, 16), 3, 200
+
+    return {
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'codec': codec.run(codec_duration),
+        'ports': ports.run(port_counts, 100, port_duration),
+        'stages': stages.run(reads),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--quick', action = 'store_true', help = 'shorter measurements')
+    parser.add_argument('--output', help = 'write the results to this file instead of stdout')
+    args = parser.parse_args()
+
+    #The library prints when ports and stages are constructed
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        results = run(args.quick)
+    finally:
+        sys.stdout = stdout
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent = 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2)
+
+
+if __name__ == '__main__':
+    main()
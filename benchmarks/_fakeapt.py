@@ -0,0 +1,41 @@
+"""Simulated APT controllers (see :mod:`thorpy.simulator`), run in a child
+process so that their CPU usage is not counted by the benchmarks."""
+import multiprocessing
+
+from thorpy.simulator import SimulatorHost, VirtualController
+
+
+def _run(count, rate, latency, jitter, conn):
+    host = SimulatorHost([VirtualController(83000000 + i, update_rate = rate, latency = latency, jitter = jitter) for i in range(count)])
+    for c in host.controllers:
+        conn.send((c.path, str(c.serial_number)))
+    conn.send(None)
+    host.run(conn.poll)
+    host.close()
+
+
+class FakeControllers:
+    """count simulated controllers, each sending rate status updates per second.
+
+    Use as a context manager; ports is a list of (tty path, serial number)."""
+
+    def __init__(self, count, rate = 100, latency = 0, jitter = 0):
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target = _run, args = (count, rate, latency, jitter, child_conn), daemon = True)
+        self._process.start()
+        self.ports = []
+        while True:
+            p = self._conn.recv()
+            if p is None:
+                break
+            self.ports.append(p)
+
+    def close(self):
+        self._conn.send(None)
+        self._process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,103 @@
+"""Message encoding/decoding throughput, for every class in thorpy.message.
+
+Run from the repository root::
+
+    python -m benchmarks.codec [--duration 0.05] [--class MGMSG_MOT_GET_DCSTATUSUPDATE]
+"""
+import argparse
+import time
+import tracemalloc
+
+from thorpy.message import Message
+
+
+def sample_message(cls):
+    """Build a valid instance of cls, with every named field set."""
+    kw = {}
+    for name, field in zip(cls._params_names, cls._message_struct_fields):
+        if name in (None, 'message_id', 'data_packet_length'):
+            continue
+        if name == 'dest':
+            kw[name] = 0x01
+        elif name == 'source':
+            kw[name] = 0x50
+        elif field.endswith('s'):
+            kw[name] = b'thorpy'[:int(field[:-1])]
+        elif field == 'c':
+            kw[name] = b'x'
+        elif field == '?':
+            kw[name] = True
+        elif field in ('f', 'd'):
+            kw[name] = 1.0
+        else:
+            kw[name] = 1
+    return cls(**kw)
+
+
+def rate(func, duration):
+    """Calls per second of func, measured over at least duration seconds."""
+    n = 0
+    batch = 64
+    start = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            func()
+        n += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return n / elapsed
+
+
+def object_size(data, count = 1000):
+    """Memory allocated per message parsed from data, in bytes."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        messages = [Message.parse(data) for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    #Don't count the list itself
+    return (after - before - len(messages) * 8) / count
+
+
+def bench_class(cls, duration):
+    msg = sample_message(cls)
+    data = msg.bytes
+    if Message.parse(data).bytes != data:
+        raise AssertionError("{0} does not survive an encode/decode round trip".format(cls.__name__))
+    return {
+        'class': cls.__name__,
+        'parse': rate(lambda: Message.parse(data), duration),
+        'parse_trusted': rate(lambda: Message.parse(data, validate = False), duration),
+        'bytes': rate(lambda: msg.bytes, duration),
+        'memory': object_size(data),
+    }
+
+
+def run(duration = 0.05, classes = None):
+    if classes is None:
+        classes = sorted(Message.all_classes(), key = lambda c: c.__name__)
+    return [bench_class(cls, duration) for cls in classes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--duration', type = float, default = 0.05, help = 'seconds per measurement')
+    parser.add_argument('--class', dest = 'classes', action = 'append', help = 'only benchmark this class')
+    args = parser.parse_args()
+    
+    classes = None
+    if args.classes:
+        classes = [c for c in Message.all_classes() if c.__name__ in args.classes]
+    
+    results = run(args.duration, classes)
+    columns = ['parse', 'parse_trusted', 'bytes', 'memory']
+    print('{0:45s}'.format('class') + ''.join('{0:>16s}'.format(c + ('/s' if c != 'memory' else ' (B/msg)')) for c in columns))
+    for r in results:
+        print('{0:45s}'.format(r['class']) + ''.join('{0:16.0f}'.format(r[c]) for c in columns))
+    print('{0:45s}'.format('mean') + ''.join('{0:16.0f}'.format(sum(r[c] for r in results) / len(results)) for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Scaling of message handling with the number of ports: one worker thread per
+port versus a shared :class:`~thorpy.comm.reactor.Reactor`.
+
+Run from the repository root (Linux only, uses pseudo-terminals)::
+
+    python -m benchmarks.ports [--ports 1 4 16] [--rate 100] [--duration 3]
+"""
+import argparse
+import gc
+import time
+
+from thorpy.comm.port import Port
+from thorpy.comm.reactor import Reactor
+from thorpy.message import MGMSG_HW_STOP_UPDATEMSGS
+
+from ._fakeapt import FakeControllers
+
+
+def _count_messages(stage, counter):
+    handle_message = stage._handle_message
+    def counting_handle_message(msg):
+        counter[0] += 1
+        return handle_message(msg)
+    stage._handle_message = counting_handle_message
+
+
+def bench(count, rate, duration, reactor):
+    with FakeControllers(count, rate) as controllers:
+        ports = [Port.create(path, sn, reactor = reactor) for path, sn in controllers.ports]
+        stages = [s for p in ports for s in p.get_stages().values()]
+        counter = [0]
+        for s in stages:
+            _count_messages(s, counter)
+
+        #Let the ports settle
+        time.sleep(0.5)
+        counter[0] = 0
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        time.sleep(duration)
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        frames = counter[0]
+
+        #Avoid unhandled updates once the stages are deleted
+        for p in ports:
+            p.send_message(MGMSG_HW_STOP_UPDATEMSGS())
+        time.sleep(0.1)
+        for s in stages:
+            del s._handle_message
+        del s, p, stages, ports
+        gc.collect()
+
+    return {
+        'mode': 'reactor' if reactor is not None else 'threads',
+        'ports': count,
+        'frames_per_second': frames / wall,
+        'cpu_percent': 100 * cpu / wall,
+        'cpu_us_per_frame': 1e6 * cpu / frames if frames else None,
+    }
+
+
+def run(port_counts = (1, 4, 16), rate = 100, duration = 3):
+    results = []
+    for count in port_counts:
+        results.append(bench(count, rate, duration, None))
+        results.append(bench(count, rate, duration, Reactor.shared()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--ports', type = int, nargs = '+', default = [1, 4, 16], help = 'numbers of simulated ports')
+    parser.add_argument('--rate', type = float, default = 100, help = 'status updates per second and per port')
+    parser.add_argument('--duration', type = float, default = 3, help = 'seconds per measurement')
+    args = parser.parse_args()
+
+    results = run(args.ports, args.rate, args.duration)
+    print('{0:>8s} {1:>6s} {2:>12s} {3:>8s} {4:>12s}'.format('mode', 'ports', 'frames/s', 'cpu %', 'cpu us/frame'))
+    for r in results:
+        print('{0[mode]:>8s} {0[ports]:6d} {0[frames_per_second]:12.0f} {0[cpu_percent]:8.1f} {0[cpu_us_per_frame]:12.1f}'.format(r))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Port and stage construction time, property read latency and memory per stage,
+with simulated controllers.
+
+Run from the repository root (Linux only, uses pseudo-terminals)::
+
+    python -m benchmarks.stages [--reads 200] [--latency 0]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from thorpy.comm.port import Port
+from thorpy.stages import GenericStage
+
+from ._fakeapt import FakeControllers
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def construction_time(count = 4):
+    """Seconds to create a port (including the handshake), and its stage."""
+    with FakeControllers(count, rate = 10) as controllers:
+        ports_time, stages_time = [], []
+        ports = []
+        for path, sn in controllers.ports:
+            start = time.perf_counter()
+            p = Port.create(path, sn)
+            ports_time.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            p.get_stages()
+            stages_time.append(time.perf_counter() - start)
+            ports.append(p)
+        del p, ports
+        gc.collect()
+    return {
+        'port_seconds': sum(ports_time) / count,
+        'stage_seconds': sum(stages_time) / count,
+    }
+
+
+def read_latency(reads = 200, latency = 0):
+    """Latency of reading GenericStage.position, when the value has to be
+    requested from the controller."""
+    with FakeControllers(1, rate = 10, latency = latency) as controllers:
+        path, sn = controllers.ports[0]
+        p = Port.create(path, sn)
+        s = p.get_stages()[1]
+        times = []
+        for i in range(reads):
+            #Force a request
+            s._state_position = None
+            start = time.perf_counter()
+            s.position
+            times.append(time.perf_counter() - start)
+        del s, p
+        gc.collect()
+    return {
+        'link_latency_seconds': latency,
+        'reads': reads,
+        'mean_seconds': sum(times) / reads,
+        'median_seconds': _percentile(times, 50),
+        'p99_seconds': _percentile(times, 99),
+    }
+
+
+def stage_memory(count = 20):
+    """Memory allocated per GenericStage object, in bytes."""
+    with FakeControllers(1, rate = 10) as controllers:
+        path, sn = controllers.ports[0]
+        p = Port.create(path, sn)
+        name = p.get_stages()[1]._name
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            stages = [GenericStage(p, 1, name) for _ in range(count)]
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        del stages, p
+        gc.collect()
+    return {
+        'bytes_per_stage': (after - before) / count,
+    }
+
+
+def run(reads = 200, latency = 0):
+    return {
+        'construction': construction_time(),
+        'read_latency': read_latency(reads, latency),
+        'memory': stage_memory(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--reads', type = int, default = 200, help = 'number of position reads')
+    parser.add_argument('--latency', type = float, default = 0, help = 'simulated link latency, in seconds')
+    args = parser.parse_args()
+
+    r = run(args.reads, args.latency)
+    print('Port construction: {0:.3f} s, stage construction: {1:.3f} s'.format(r['construction']['port_seconds'], r['construction']['stage_seconds']))
+    print('Position read: mean {0:.3f} ms, median {1:.3f} ms, p99 {2:.3f} ms'.format(*(1e3 * r['read_latency'][k] for k in ('mean_seconds', 'median_seconds', 'p99_seconds'))))
+    print('Memory: {0:.0f} B/stage'.format(r['memory']['bytes_per_stage']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def controller():
+    """A simulated controller with one stage, on a pseudo-terminal."""
+    pytest.importorskip('serial')
+    if not hasattr(os, 'openpty'):
+        pytest.skip('the simulator needs pseudo-terminals')
+    from thorpy.simulator import VirtualController, SimulatorHost
+    c = VirtualController()
+    with SimulatorHost([c]):
+        yield c
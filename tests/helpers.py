@@ -0,0 +1,51 @@
+"""Frames and simulated controllers shared by the tests."""
+import os
+import struct
+
+import pytest
+
+from thorpy.message import MGMSG_MOT_GET_DCSTATUSUPDATE, MGMSG_HW_STOP_UPDATEMSGS
+
+#Short message with an unknown ID
+unknown = struct.pack('<HBBBB', 0x7777, 0, 0, 0x01, 0x50)
+
+
+def status(position = 0, chan_ident = 1):
+    return MGMSG_MOT_GET_DCSTATUSUPDATE(dest = 0x01, source = 0x50, chan_ident = chan_ident,
+                                        position = position, velocity = 0, status_bits = 0x80000000)
+
+
+def invalid_status():
+    """A status update frame for channel 3, which fails validation."""
+    data = bytearray(status().bytes)
+    data[6] = 3  #chan_ident
+    return bytes(data)
+
+
+def open_stage(controller, **kw):
+    """Open the port of a simulated controller, return (port, first stage)."""
+    from thorpy.comm.port import Port
+    port = Port.create(controller.path, str(controller.serial_number), **kw)
+    return port, list(port.get_stages().values())[0]
+
+
+def close(port):
+    port.send_message(MGMSG_HW_STOP_UPDATEMSGS())
+    port.close()
+
+
+def inject(controller, data):
+    #Raw bytes, sent by the controller before anything else it has queued
+    controller._output.appendleft((0, data))
+
+
+def simulated(count, **kw):
+    """Return count simulated controllers (created with the keyword arguments
+    kw), and the (not started) SimulatorHost running them. Skips the test if
+    the simulator can't run."""
+    pytest.importorskip('serial')
+    if not hasattr(os, 'openpty'):
+        pytest.skip('the simulator needs pseudo-terminals')
+    from thorpy.simulator import VirtualController, SimulatorHost
+    controllers = [VirtualController(serial_number = 83000001 + i, **kw) for i in range(count)]
+    return controllers, SimulatorHost(controllers)
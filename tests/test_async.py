@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from thorpy.message import MGMSG_HW_STOP_UPDATEMSGS
+
+
+def run(controller, test):
+    """Open the simulated controller with an AsyncPort, and run the coroutine
+    test(stage) with its AsyncStage."""
+    from thorpy.comm.asyncport import AsyncPort
+    async def main():
+        port = await AsyncPort.create(controller.path, str(controller.serial_number))
+        try:
+            return await test(port.get_stages()[1])
+        finally:
+            port.send_message(MGMSG_HW_STOP_UPDATEMSGS())
+            port.close()
+    return asyncio.run(main())
+
+
+def test_get_position_and_snapshot(controller):
+    async def test(stage):
+        assert await stage.get_position() == 0
+        snapshot = await stage.snapshot()
+        assert snapshot.position == 0
+        assert snapshot.flags.channel_enabled
+    run(controller, test)
+
+
+def test_move_to(controller):
+    async def test(stage):
+        assert await stage.move_to(0.5, timeout = 10) == pytest.approx(0.5, abs = 1e-4)
+        assert await stage.get_position() == pytest.approx(0.5, abs = 1e-4)
+    run(controller, test)
+
+
+def test_home(controller):
+    controller.channel().position = 100000.0
+    async def test(stage):
+        assert await stage.home(timeout = 10)
+        assert (await stage.snapshot()).flags.homed
+        #Already homed
+        assert await stage.home(timeout = 0)
+    run(controller, test)
+
+
+def test_home_stopped(controller):
+    controller.channel().position = 100000.0
+    async def test(stage):
+        homing = asyncio.ensure_future(stage.home(timeout = 10))
+        await asyncio.sleep(0.3)
+        await stage.stop(timeout = 10)
+        assert not await homing
+        assert not (await stage.snapshot()).flags.homed
+    run(controller, test)
+
+
+def test_blocking_reads_are_rejected(controller):
+    async def test(stage):
+        with pytest.raises(TypeError):
+            stage.stage.min_velocity
+    run(controller, test)
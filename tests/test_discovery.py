@@ -0,0 +1,141 @@
+import time
+
+import pytest
+
+from helpers import close, simulated
+
+
+@pytest.mark.parametrize('use_reactor', [False, True], ids = ['thread', 'reactor'])
+def test_parallel_discovery_ports_outlive_the_workers(use_reactor):
+    from thorpy.comm.discovery import discover_stages_parallel
+    from thorpy.comm.reactor import Reactor
+    controllers, host = simulated(2)
+    with host:
+        stages = discover_stages_parallel(timeout = 0.5, ports = [(c.path, str(c.serial_number)) for c in controllers],
+                                          reactor = Reactor() if use_reactor else None)
+        try:
+            assert len(stages) == 2
+            #The executor is shut down: the ports must still be handled
+            time.sleep(0.2)
+            for stage in stages:
+                assert stage.get_position(max_age = 0, timeout = 2) == 0
+        finally:
+            for stage in stages:
+                close(stage._port)
+
+
+def test_cached_controller_mismatch_is_dropped(tmp_path):
+    from thorpy.comm.cache import DiscoveryCache
+    from thorpy.comm.discovery import discover_stages_cached
+    from thorpy.simulator import VirtualController
+    controllers, host = simulated(1)
+    c = controllers[0]
+    with host:
+        cache = DiscoveryCache(str(tmp_path / 'discovery.json'))
+        #Another controller was on this port
+        cache.set(str(c.serial_number), c.path, VirtualController(serial_number = 83000002)._info)
+        stages = discover_stages_cached(cache, timeout = 0.2)
+        assert len(stages) == 1
+        port = stages[0]._port
+        with pytest.raises(ValueError):
+            port.verification.result(2)
+        time.sleep(0.1)
+        assert port.closed
+        assert len(DiscoveryCache(cache.path)) == 0
+
+
+def test_cached_controller_not_answering_is_dropped(tmp_path):
+    from thorpy.comm.cache import DiscoveryCache
+    from thorpy.comm.discovery import discover_stages_cached
+    from thorpy.message import MGMSG_HW_REQ_INFO
+    controllers, host = simulated(1)
+    c = controllers[0]
+    handle = c.handle
+    c.handle = lambda msg, now: None if isinstance(msg, MGMSG_HW_REQ_INFO) else handle(msg, now)
+    with host:
+        cache = DiscoveryCache(str(tmp_path / 'discovery.json'))
+        cache.set(str(c.serial_number), c.path, c._info)
+        stages = discover_stages_cached(cache, timeout = 0.1, retries = 2)
+        assert len(stages) == 1
+        port = stages[0]._port
+        time.sleep(0.5)
+        assert port.verification.cancelled()
+        assert port.closed
+        assert len(DiscoveryCache(cache.path)) == 0
+
+
+def test_concurrent_cache_saves(tmp_path):
+    import threading
+    from thorpy.comm.cache import DiscoveryCache
+    from thorpy.simulator import VirtualController
+    cache = DiscoveryCache(str(tmp_path / 'discovery.json'))
+    errors = []
+    def save(i):
+        try:
+            for j in range(50):
+                cache.set(str(i), '/dev/ttyUSB{0}'.format(i), VirtualController()._info)
+                cache.save()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target = save, args = (i, )) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(DiscoveryCache(cache.path)) == 8
+    assert [p.name for p in tmp_path.iterdir()] == ['discovery.json']
+
+
+def test_cached_discovery_finds_new_controllers(tmp_path, monkeypatch):
+    from thorpy.comm import discovery, sysfs
+    from thorpy.comm.cache import DiscoveryCache
+    controllers, host = simulated(2)
+    with host:
+        ports = [(c.path, str(c.serial_number)) for c in controllers]
+        monkeypatch.setattr(discovery, 'find_ports', lambda: ports)
+        monkeypatch.setattr(sysfs, 'available', lambda root = '/sys': True)
+        handshaked = []
+        discover_stages_parallel = discovery.discover_stages_parallel
+        def recording(*args, ports, **kw):
+            handshaked.append(ports)
+            return discover_stages_parallel(*args, ports = ports, **kw)
+        monkeypatch.setattr(discovery, 'discover_stages_parallel', recording)
+        cache = DiscoveryCache(str(tmp_path / 'discovery.json'))
+        for stage in discovery.discover_stages_cached(cache, timeout = 0.5, ports = ports[:1]):
+            close(stage._port)
+        assert len(cache) == 1
+        #The second controller was plugged in since: found, and only it is handshaked
+        stages = discovery.discover_stages_cached(cache, timeout = 0.5)
+        try:
+            assert sorted(stage._port.serial_number for stage in stages) == [c.serial_number for c in controllers]
+            assert handshaked[-1] == ports[1:]
+            assert len(cache) == 2
+        finally:
+            for stage in stages:
+                close(stage._port)
+
+
+def test_parallel_discovery_skips_dead_controller():
+    import os
+    import tty
+    from thorpy.comm.discovery import discover_stages_parallel
+    (c, ), host = simulated(1)
+    #A serial port on which nobody answers
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    try:
+        with host:
+            start = time.perf_counter()
+            stages = discover_stages_parallel(timeout = 0.3, retries = 2,
+                                              ports = [(os.ttyname(slave), '83000099'), (c.path, str(c.serial_number))])
+            elapsed = time.perf_counter() - start
+            try:
+                assert [stage._port.serial_number for stage in stages] == [c.serial_number]
+                assert elapsed < 0.3 * 2 + 0.4
+            finally:
+                for stage in stages:
+                    close(stage._port)
+    finally:
+        os.close(slave)
+        os.close(master)
@@ -0,0 +1,39 @@
+import pytest
+
+from thorpy.stages import StageGroup
+
+from helpers import open_stage, close, simulated
+
+
+@pytest.fixture
+def stages():
+    controllers, host = simulated(3)
+    with host:
+        opened = [open_stage(c) for c in controllers]
+        yield [stage for port, stage in opened]
+        for port, stage in opened:
+            close(port)
+
+
+def test_move_to(stages):
+    group = StageGroup(stages)
+    assert len(group) == 3
+    result = group.move_to([0.5, 1, 0.25], timeout = 10)
+    assert result.positions == pytest.approx([0.5, 1, 0.25], abs = 1e-4)
+    assert 0 <= result.start_skew < 0.1
+    assert len(result.durations) == 3 and all(d > 0 for d in result.durations)
+    #The longest move takes the longest
+    assert result.durations[1] == max(result.durations)
+
+
+def test_move_to_checks_positions(stages):
+    with pytest.raises(ValueError):
+        StageGroup(stages).move_to([1, 2])
+
+
+def test_move_to_timeout(stages):
+    group = StageGroup(stages[:1])
+    with pytest.raises(TimeoutError):
+        group.move_to([5], timeout = 0.1)
+    assert stages[0].wait_for_move(0)
+    stages[0].stop().result(10)
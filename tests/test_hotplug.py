@@ -0,0 +1,89 @@
+import time
+import weakref
+
+import pytest
+
+from helpers import open_stage, close, simulated
+
+
+def wait_until(condition, timeout = 5):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize('use_reactor', [False, True], ids = ['thread', 'reactor'])
+def test_reattached_port_outlives_the_watcher(use_reactor):
+    from thorpy.comm.hotplug import HotplugWatcher
+    from thorpy.comm.reactor import Reactor
+    (c, ), host = simulated(1)
+    reactor = Reactor() if use_reactor else None
+    with host:
+        port, stage = open_stage(c, reactor = reactor)
+        del port
+        watcher = HotplugWatcher(interval = 0.02, reactor = reactor,
+                                 find_ports = lambda: [(x.path, str(x.serial_number)) for x in list(host.controllers)])
+        events = []
+        watcher.add_listener(lambda event, port, sn: events.append(event))
+        watcher.start()
+        try:
+            host.remove(c)
+            wait_until(lambda: events == ['detach'])
+            host.add(c)
+            wait_until(lambda: events == ['detach', 'attach'])
+        finally:
+            watcher.stop()
+        assert stage._port._port == c.path
+        #The port was created by the watcher thread, which is gone
+        time.sleep(0.2)
+        assert stage.get_position(max_age = 0, timeout = 2) == 0
+        close(stage._port)
+
+
+class FakeStage:
+    def __init__(self):
+        self.port = None
+
+    def _reattach(self, port):
+        self.port = port
+
+
+def test_failed_attach_is_retried(monkeypatch):
+    pytest.importorskip('serial')
+    from thorpy.comm.hotplug import HotplugWatcher
+    from thorpy.comm.port import Port
+
+    class FakePort:
+        def __init__(self):
+            self._stages = {}
+
+    failing = {'/dev/a'}
+    def create(port, serial_number, **kw):
+        if port in failing:
+            raise TimeoutError("No answer from {0}".format(port))
+        return FakePort()
+    monkeypatch.setattr(Port, 'create', create)
+
+    present = [('/dev/z', '3')]
+    watcher = HotplugWatcher(find_ports = lambda: list(present))
+    stages = [FakeStage(), FakeStage()]
+    watcher._orphan_stages = {'1': {1: weakref.ref(stages[0])}, '2': {1: weakref.ref(stages[1])}}
+    events = []
+    watcher.add_listener(lambda event, port, sn: events.append((event, port)))
+
+    #/dev/z unplugged, /dev/a and /dev/b plugged in
+    present = [('/dev/a', '1'), ('/dev/b', '2')]
+    watcher.poll()
+    #/dev/a doesn't hold up /dev/b
+    assert events == [('detach', '/dev/z'), ('attach', '/dev/b')]
+    assert stages[0].port is None and stages[1].port is not None
+    watcher.poll()
+    watcher.poll()
+    assert events == [('detach', '/dev/z'), ('attach', '/dev/b')]
+    failing.clear()
+    watcher.poll()
+    assert events[2:] == [('attach', '/dev/a')]
+    assert stages[0].port is not None
+    watcher.poll()
+    assert len(events) == 3
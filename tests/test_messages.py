@@ -0,0 +1,84 @@
+import struct
+
+import pytest
+
+import thorpy.message
+from thorpy.message import Message, MessageWithData
+
+from benchmarks.codec import sample_message
+from helpers import invalid_status
+
+
+all_classes = sorted(Message.all_classes(), key = lambda c: c.__name__)
+
+
+def test_all_message_classes_exported_are_registered():
+    exported = [v for v in vars(thorpy.message).values()
+                if isinstance(v, type) and issubclass(v, Message) and v.message_id is not None]
+    assert len(exported) > 100
+    for cls in exported:
+        assert Message._by_name[cls.__name__] is cls
+        #Classes sharing an ID with another one are not parsed, the first one wins
+        registered = Message.get_class(cls.message_id, cls._message_struct.size > 6)
+        assert registered is cls or registered.message_id == cls.message_id
+
+
+@pytest.mark.parametrize('cls', all_classes, ids = lambda c: c.__name__)
+def test_registry(cls):
+    assert Message.get_class(cls.message_id, cls._message_struct.size > 6) is cls
+
+
+@pytest.mark.parametrize('validate', [True, False], ids = ['validated', 'trusted'])
+@pytest.mark.parametrize('cls', all_classes, ids = lambda c: c.__name__)
+def test_round_trip(cls, validate):
+    msg = sample_message(cls)
+    data = msg.bytes
+    assert len(data) == cls._message_struct.size
+
+    parsed = Message.parse(data, validate = validate)
+    assert type(parsed) is cls
+    assert parsed.bytes == data
+    for name in parsed.keys():
+        if name is not None:
+            assert parsed[name] == msg[name]
+
+
+def test_parse_at_offset():
+    cls = thorpy.message.MGMSG_MOT_MOVE_COMPLETED
+    data = sample_message(cls).bytes
+    assert Message.parse(b'\x00' * 3 + data, offset = 3).bytes == data
+
+
+def test_parse_invalid_field():
+    with pytest.raises(ValueError):
+        Message.parse(invalid_status())
+    assert Message.parse(invalid_status(), validate = False)['chan_ident'] == 3
+
+
+def test_malformed_length_mismatch():
+    with pytest.raises(TypeError):
+        class MGMSG_TEST_LENGTH_MISMATCH(MessageWithData):
+            message_id = 0x7F01
+            _message_struct_fields = ['H', 'H', 'B', 'B'] + ['H', 'i']
+            _params_names = ['message_id', 'data_packet_length', 'dest', 'source'] + ['chan_ident']
+            _message_struct = struct.Struct('<' + ''.join(_message_struct_fields))
+
+
+def test_malformed_struct_mismatch():
+    with pytest.raises(TypeError):
+        class MGMSG_TEST_STRUCT_MISMATCH(MessageWithData):
+            message_id = 0x7F02
+            _message_struct_fields = ['H', 'H', 'B', 'B'] + ['H', 'i']
+            _params_names = ['message_id', 'data_packet_length', 'dest', 'source'] + ['chan_ident', 'position']
+            _message_struct = struct.Struct('<HHBBHI')
+
+
+def test_malformed_no_struct():
+    with pytest.raises(TypeError):
+        class MGMSG_TEST_NO_STRUCT(MessageWithData):
+            message_id = 0x7F03
+            _message_struct_fields = ['H', 'H', 'B', 'B'] + ['H']
+            _params_names = ['message_id', 'data_packet_length', 'dest', 'source'] + ['chan_ident']
+    #Not registered
+    with pytest.raises(ValueError):
+        Message.get_class(0x7F03, True)
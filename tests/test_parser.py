@@ -0,0 +1,87 @@
+import struct
+
+import pytest
+
+from thorpy.message import *
+
+from helpers import status, invalid_status, unknown
+
+
+def test_messages_split_across_feeds():
+    data = status(1).bytes + MGMSG_HW_STOP_UPDATEMSGS(dest = 0x50, source = 0x01).bytes + status(2).bytes
+    parser = FrameParser()
+    messages = []
+    for i in range(len(data)):
+        messages.extend(parser.feed(data[i:i + 1]))
+    assert [type(m) for m in messages] == [MGMSG_MOT_GET_DCSTATUSUPDATE, MGMSG_HW_STOP_UPDATEMSGS, MGMSG_MOT_GET_DCSTATUSUPDATE]
+    assert [messages[0]['position'], messages[2]['position']] == [1, 2]
+    assert len(parser) == 0
+
+
+def test_incomplete_message():
+    parser = FrameParser()
+    parser.feed(status().bytes[:-1])
+    assert parser.next_message() is None
+    assert len(parser) == len(status().bytes) - 1
+
+
+@pytest.mark.parametrize('bad', [unknown, invalid_status()], ids = ['unknown', 'invalid'])
+def test_bad_frame_is_skipped(bad):
+    parser = FrameParser()
+    parser.feed(status(1).bytes + bad + status(2).bytes)
+    assert parser.next_message()['position'] == 1
+    with pytest.raises(ValueError):
+        parser.next_message()
+    #The parser stays in sync
+    assert parser.next_message()['position'] == 2
+    assert parser.next_message() is None
+    parser.feed(status(3).bytes)
+    assert parser.next_message()['position'] == 3
+
+
+def test_iteration_skips_bad_frames(capsys):
+    errors = []
+    parser = FrameParser(on_error = errors.append)
+    data = status(1).bytes + unknown + invalid_status() + status(2).bytes
+    assert [msg['position'] for msg in parser.feed(data)] == [1, 2]
+    assert len(errors) == 2 and all(isinstance(e, ValueError) for e in errors)
+    #By default, skipped frames are printed
+    parser = FrameParser()
+    assert [msg['position'] for msg in parser.feed(unknown + status(3).bytes)] == [3]
+    assert 'Skipped invalid message' in capsys.readouterr().out
+
+
+def test_trusted_parser_does_not_validate():
+    parser = FrameParser(validate = False)
+    parser.feed(invalid_status())
+    assert parser.next_message()['chan_ident'] == 3
+
+
+def test_compaction():
+    parser = FrameParser()
+    parser.compact_threshold = 64
+    data = status().bytes
+    for i in range(100):
+        parser.feed(data + data[:5])
+        parser.next_message()
+        parser.feed(data[5:])
+        parser.next_message()
+    assert len(parser) == 0
+
+
+@pytest.mark.parametrize('k', range(1, 26))
+def test_misaligned_stream_resyncs(k):
+    good = status(1).bytes
+    parser = FrameParser(on_error = lambda e: None)
+    messages = list(parser.feed(good[k:] + good * 50))
+    assert len(messages) >= 50
+    assert all(msg['position'] == 1 for msg in messages[-50:])
+    assert len(parser) == 0
+
+
+def test_garbage_length_does_not_swallow_the_stream():
+    garbage = struct.pack('<HHBB', 0x7777, 0xFFFF, 0x81, 0x50)
+    parser = FrameParser(on_error = lambda e: None)
+    messages = list(parser.feed(garbage + status(1).bytes * 1000))
+    assert len(messages) == 1000
+    assert len(parser) == 0
@@ -0,0 +1,144 @@
+import time
+import concurrent.futures
+
+import pytest
+
+from thorpy.message import MGMSG_HW_STOP_UPDATEMSGS
+
+from helpers import open_stage, close, inject, invalid_status, unknown, simulated
+
+
+def test_move(controller):
+    port, stage = open_stage(controller)
+    try:
+        assert stage.move_to(0.5).result(10) == pytest.approx(0.5, abs = 1e-4)
+        assert stage.get_position(max_age = 0) == pytest.approx(0.5, abs = 1e-4)
+        assert stage.wait_for_move(0)
+    finally:
+        close(port)
+
+
+@pytest.mark.parametrize('use_reactor', [False, True], ids = ['thread', 'reactor'])
+def test_bad_frames_keep_port_alive(controller, use_reactor):
+    from thorpy.comm.reactor import Reactor
+    reactor = Reactor() if use_reactor else None
+    port, stage = open_stage(controller, reactor = reactor)
+    try:
+        stage.get_position()
+        inject(controller, unknown + invalid_status())
+        time.sleep(0.2)
+        assert not port.lost
+        for i in range(3):
+            inject(controller, unknown)
+            assert stage.get_position(max_age = 0, timeout = 2) == 0
+    finally:
+        close(port)
+
+
+def test_handshake_timeout_with_invalid_frame_pending():
+    import os
+    if not hasattr(os, 'openpty'):
+        pytest.skip('needs pseudo-terminals')
+    pytest.importorskip('serial')
+    from thorpy.comm.port import Port
+    master, slave = os.openpty()
+    try:
+        os.write(master, invalid_status() * 3)
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            Port.create(os.ttyname(slave), '83000001', timeout = 0.2, retries = 2)
+        assert time.perf_counter() - start < 2
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def test_handshake_skips_invalid_frame(controller):
+    inject(controller, unknown + invalid_status())
+    port, stage = open_stage(controller, timeout = 0.5, retries = 1)
+    close(port)
+
+
+def test_cached_info_is_requested_again(controller):
+    from thorpy.message import MGMSG_HW_REQ_INFO
+    info = controller._info
+    #Drop the next MGMSG_HW_REQ_INFO
+    handle = controller.handle
+    dropped = []
+    def lossy_handle(msg, now):
+        if isinstance(msg, MGMSG_HW_REQ_INFO) and not dropped:
+            dropped.append(msg)
+            return
+        handle(msg, now)
+    controller.handle = lossy_handle
+    port, stage = open_stage(controller, timeout = 0.2, retries = 3, info = info)
+    try:
+        assert port.verification.result(2)['serial_number'] == controller.serial_number
+        assert dropped
+    finally:
+        close(port)
+
+
+def test_cached_info_mismatch(controller):
+    from thorpy.simulator import VirtualController
+    stale = VirtualController(serial_number = 83000002)._info
+    port, stage = open_stage(controller, timeout = 0.2, info = stale)
+    try:
+        with pytest.raises(ValueError):
+            port.verification.result(2)
+        #The known information is kept
+        assert port._info_message['serial_number'] == 83000002
+    finally:
+        close(port)
+
+
+def test_verification_cancelled_on_close(controller):
+    from thorpy.message import MGMSG_HW_REQ_INFO
+    handle = controller.handle
+    controller.handle = lambda msg, now: None if isinstance(msg, MGMSG_HW_REQ_INFO) else handle(msg, now)
+    port, stage = open_stage(controller, timeout = 0.2, info = controller._info)
+    close(port)
+    assert port.verification.cancelled()
+
+
+def test_close_reactor_ports_while_serviced(capsys):
+    from thorpy.comm.reactor import Reactor
+    controllers, host = simulated(20, update_rate = 2000)
+    reactor = Reactor()
+    with host:
+        opened = [open_stage(c, reactor = reactor) for c in controllers]
+        time.sleep(0.2)
+        for port, stage in opened:
+            port.close()
+        time.sleep(0.2)
+        assert not any(port.lost for port, stage in opened)
+    assert 'Traceback' not in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('use_reactor', [False, True], ids = ['thread', 'reactor'])
+def test_lost_port_ends_pending_motions(use_reactor):
+    from thorpy.comm.port import Port
+    from thorpy.comm.reactor import Reactor
+    (c, ), host = simulated(1)
+    with host:
+        port, stage = open_stage(c, reactor = Reactor() if use_reactor else None)
+        path = c.path
+        future = stage.move_to(40)
+        host.remove(c)
+        with pytest.raises(concurrent.futures.CancelledError):
+            future.result(1.5)
+        assert port.lost
+        assert stage.wait_for_move(0)
+        assert len(port._waiters) == 0
+        #Opened again by Port.create
+        assert path not in Port.static_port_list
+        port.close()
+
+
+def test_close_does_not_wait_for_the_worker_timeout(controller):
+    port, stage = open_stage(controller)
+    port.send_message(MGMSG_HW_STOP_UPDATEMSGS())
+    time.sleep(0.1)
+    start = time.perf_counter()
+    port.close()
+    assert time.perf_counter() - start < 0.5
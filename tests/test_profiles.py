@@ -0,0 +1,51 @@
+import configparser
+import pkgutil
+
+import pytest
+
+from thorpy.stages import StageProfile, stage_profiles, get_stage_profile
+
+
+@pytest.fixture(scope = 'module')
+def ini():
+    config = configparser.ConfigParser()
+    config.read_string(pkgutil.get_data('thorpy.stages', 'MG17APTServer.ini').decode('ascii'))
+    return config
+
+
+def test_profiles_are_shared():
+    assert get_stage_profile('MTS50-Z8') is get_stage_profile('MTS50-Z8')
+    assert stage_profiles() is stage_profiles()
+    assert isinstance(get_stage_profile('MTS50-Z8'), StageProfile)
+
+
+def test_profiles_are_immutable():
+    profile = get_stage_profile('MTS50-Z8')
+    with pytest.raises(AttributeError):
+        profile.pitch = 2.0
+    with pytest.raises(AttributeError):
+        profile.position_factor = 1
+    with pytest.raises(AttributeError):
+        del profile.pitch
+    assert profile.pitch == 1.0
+
+
+@pytest.mark.parametrize('name', ['MTS50-Z8', 'PRM1-Z8', 'HS LTS300 300mm Stage', 'Z825'])
+def test_conversion_factors(ini, name):
+    #Formulas of GenericStage._EncCnt and GenericStage._T
+    T = 2048 / 6e6
+    encoder_counts = ini.getint(name, 'Steps Per Rev') * ini.getint(name, 'Gearbox Ratio') / ini.getfloat(name, 'Pitch')
+    profile = get_stage_profile(name)
+    assert profile.position_factor == pytest.approx(encoder_counts)
+    assert profile.velocity_factor == pytest.approx(encoder_counts * T * 65536)
+    assert profile.acceleration_factor == pytest.approx(encoder_counts * (T ** 2) * 65536)
+    assert profile.status_velocity_factor == pytest.approx(encoder_counts * T)
+
+
+def test_unknown_stage():
+    with pytest.raises(configparser.NoSectionError):
+        get_stage_profile('No such stage')
+    #Not a stage, only the list of the stepper stages
+    assert 'Stepper Stages' not in stage_profiles()
+    with pytest.raises(configparser.NoSectionError):
+        get_stage_profile('Stepper Stages')
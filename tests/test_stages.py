@@ -0,0 +1,186 @@
+import time
+import threading
+
+import pytest
+
+from thorpy.message import *
+
+from helpers import open_stage, close, simulated
+
+
+def count_requests(controller, cls, drop = False):
+    """Count the messages of class cls received by controller (and drop them)."""
+    handle = controller.handle
+    received = []
+    def counting_handle(msg, now):
+        if isinstance(msg, cls):
+            received.append(msg)
+            if drop:
+                return
+        handle(msg, now)
+    controller.handle = counting_handle
+    return received
+
+
+def test_max_age(controller):
+    port, stage = open_stage(controller)
+    try:
+        requests = count_requests(controller, MGMSG_MOT_REQ_STATUSUPDATE)
+        stage.get_position(max_age = 0)
+        assert len(requests) == 1
+        #Fresh enough: no request
+        stage.get_position(max_age = 10)
+        stage.get_status_flags(max_age = 10)
+        stage.snapshot(max_age = 10)
+        assert len(requests) == 1
+        time.sleep(0.05)
+        stage.get_velocity(max_age = 0)
+        assert len(requests) == 2
+    finally:
+        close(port)
+
+
+def test_max_age_timeout(controller):
+    port, stage = open_stage(controller)
+    try:
+        port.send_message(MGMSG_HW_STOP_UPDATEMSGS())
+        stage.get_position()
+        count_requests(controller, MGMSG_MOT_REQ_STATUSUPDATE, drop = True)
+        time.sleep(0.05)
+        with pytest.raises(TimeoutError):
+            stage.get_position(max_age = 0, timeout = 0.3)
+        #Any value is fine
+        assert stage.get_position(timeout = 0.3) == 0
+    finally:
+        close(port)
+
+
+def test_motion_futures(controller):
+    port, stage = open_stage(controller)
+    try:
+        assert stage.home_async(force = True).result(10) == 0
+        assert stage.get_status_flags(max_age = 0).homed
+        assert stage.move_to(1).result(10) == pytest.approx(1, abs = 1e-4)
+        assert stage.move_by(-0.5).result(10) == pytest.approx(0.5, abs = 1e-4)
+        assert stage.jog().result(10) > 0.5
+        #Already homed
+        assert stage.home_async().done()
+    finally:
+        close(port)
+
+
+def test_move_velocity_until_stopped(controller):
+    port, stage = open_stage(controller)
+    try:
+        moving = stage.move_velocity()
+        time.sleep(0.2)
+        assert not moving.done()
+        position = stage.stop().result(10)
+        assert moving.result(10) == position > 0
+        assert stage.wait_for_move(0)
+    finally:
+        close(port)
+
+
+def test_cancelled_future_is_not_waited_for(controller):
+    port, stage = open_stage(controller)
+    try:
+        future = stage.move_to(1)
+        future.cancel()
+        assert len(port._waiters) == 0
+    finally:
+        stage.stop().result(10)
+        close(port)
+
+
+@pytest.mark.parametrize('home', [False, True], ids = ['move', 'home'])
+def test_close_ends_pending_motions(controller, home):
+    #Away from home, else homing ends at once
+    controller.channel().position = 100000.0
+    port, stage = open_stage(controller)
+    future = stage.home_async(force = True) if home else stage.move_to(5)
+    close(port)
+    assert future.cancelled()
+    assert stage.wait_for_move(1)
+    assert stage.wait_for_home(1)
+
+
+def test_home(controller):
+    controller.channel().position = 100000.0
+    port, stage = open_stage(controller)
+    try:
+        assert stage.home(timeout = 10)
+        assert stage.get_status_flags(max_age = 0).homed
+    finally:
+        close(port)
+
+
+def test_home_stopped(controller):
+    controller.channel().position = 100000.0
+    port, stage = open_stage(controller)
+    try:
+        threading.Timer(0.3, stage.stop).start()
+        assert not stage.home(timeout = 10)
+        assert not stage.get_status_flags(max_age = 0).homed
+    finally:
+        close(port)
+
+
+def test_home_timeout(controller):
+    controller.channel().position = 100000.0
+    port, stage = open_stage(controller)
+    try:
+        with pytest.raises(TimeoutError):
+            stage.home(timeout = 0.1)
+    finally:
+        stage.stop().result(10)
+        close(port)
+
+
+def test_cancel_ends_only_its_motion(controller):
+    controller.channel().position = 100000.0
+    port, stage = open_stage(controller)
+    try:
+        homing = stage.home_async(force = True)
+        stage.move_to(1).cancel()
+        assert stage.wait_for_move(0)
+        assert not stage.wait_for_home(0)
+        assert not homing.done()
+    finally:
+        stage.stop().result(10)
+        close(port)
+
+
+def test_max_age_ignores_clock_changes(controller, monkeypatch):
+    port, stage = open_stage(controller)
+    try:
+        stage.get_position(max_age = 0)
+        requests = count_requests(controller, MGMSG_MOT_REQ_STATUSUPDATE)
+        wall_clock = time.time
+        monkeypatch.setattr(time, 'time', lambda: wall_clock() + 3600)
+        stage.get_position(max_age = 10)
+        assert len(requests) == 0
+    finally:
+        monkeypatch.undo()
+        close(port)
+
+
+def test_velocity_not_reported():
+    (c, ), host = simulated(1, dc_servo = False)
+    with host:
+        port, stage = open_stage(c)
+        try:
+            start = time.perf_counter()
+            assert stage.get_velocity(max_age = 0, timeout = 2) is None
+            assert time.perf_counter() - start < 1
+            assert stage.snapshot().velocity is None
+        finally:
+            close(port)
+
+
+def test_velocity(controller):
+    port, stage = open_stage(controller)
+    try:
+        assert stage.get_velocity(max_age = 0) == 0
+    finally:
+        close(port)
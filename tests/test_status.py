@@ -0,0 +1,50 @@
+import pytest
+
+from thorpy.stages import StatusFlags, StageSnapshot, decode_status_bits
+
+from helpers import open_stage, close, status
+
+
+def test_decode_status_bits():
+    flags = decode_status_bits(0x80000000 | 0x00000400 | 0x00000010)
+    assert flags.channel_enabled and flags.homed and flags.in_motion_forward
+    assert flags.in_motion
+    assert flags.names() == ['in_motion_forward', 'homed', 'channel_enabled']
+    assert not decode_status_bits(0x80000000).in_motion
+    #Cached, and immutable
+    assert decode_status_bits(0x80000000) is decode_status_bits(0x80000000)
+    with pytest.raises(AttributeError):
+        flags.homed = False
+
+
+def test_snapshot_from_message():
+    from thorpy.stages.profiles import get_stage_profile
+    profile = get_stage_profile('MTS50-Z8')
+    snapshot = StageSnapshot.from_message(profile, status(position = 2500), 12.5)
+    assert snapshot.position == pytest.approx(2500 / profile.position_factor)
+    assert snapshot.velocity == 0
+    assert snapshot.flags == decode_status_bits(snapshot.status_bits)
+    assert snapshot.timestamp == 12.5
+
+
+def test_snapshot(controller):
+    port, stage = open_stage(controller)
+    try:
+        snapshot = stage.snapshot(max_age = 0)
+        assert isinstance(snapshot, StageSnapshot)
+        assert isinstance(snapshot.flags, StatusFlags)
+        assert snapshot.position == stage.get_position()
+        assert snapshot.flags.channel_enabled
+        assert stage.snapshot().timestamp >= snapshot.timestamp
+    finally:
+        close(port)
+
+
+def test_status_properties(controller):
+    port, stage = open_stage(controller)
+    try:
+        flags = stage.get_status_flags(max_age = 0)
+        for name in StatusFlags._fields:
+            assert getattr(stage, 'status_' + name) == getattr(flags, name)
+    finally:
+        close(port)
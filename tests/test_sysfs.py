@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from thorpy.comm import sysfs
+from thorpy.comm.discovery import find_ports_sysfs
+
+
+def usb_device(root, name, tty, **attributes):
+    """Create the USB device name, with the serial port tty on its first interface."""
+    device = root / 'devices' / 'pci0000:00' / 'usb1' / name
+    interface = device / (name + ':1.0') / tty
+    interface.mkdir(parents = True)
+    for attribute, value in attributes.items():
+        (device / attribute).write_text(value + '\n')
+    tty_class(root, tty, interface)
+
+
+def tty_class(root, tty, device = None):
+    path = root / 'class' / 'tty' / tty
+    path.mkdir(parents = True)
+    if device is not None:
+        os.symlink(os.path.relpath(device, path), path / 'device')
+
+
+@pytest.fixture
+def root(tmp_path):
+    usb_device(tmp_path, '1-1', 'ttyUSB0', idVendor = '0403', idProduct = 'faf0',
+               serial = '83000001', manufacturer = 'Thorlabs', product = 'APT DC Motor Controller')
+    usb_device(tmp_path, '1-2', 'ttyUSB1', idVendor = '067b', idProduct = '2303',
+               manufacturer = 'Prolific Technology Inc.', product = 'USB-Serial Controller')
+    #Virtual terminal: no device
+    tty_class(tmp_path, 'tty0')
+    return str(tmp_path)
+
+
+def test_find_ports_sysfs(root):
+    assert find_ports_sysfs(root = root) == [('/dev/ttyUSB0', '83000001')]
+
+
+def test_list_ports(root):
+    assert sysfs.available(root)
+    ports = dict(sysfs.list_ports(root))
+    assert sorted(ports) == ['/dev/ttyUSB0', '/dev/ttyUSB1']
+    assert ports['/dev/ttyUSB1']['manufacturer'] == 'Prolific Technology Inc.'
+    #Missing attribute
+    assert ports['/dev/ttyUSB1']['serial'] is None
+
+
+def test_usb_attributes(root):
+    assert sysfs.usb_attributes('/dev/ttyUSB0', root)['serial'] == '83000001'
+    assert sysfs.usb_attributes('/dev/tty0', root) is None
+    assert sysfs.usb_attributes('/dev/ttyUSB9', root) is None
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from thorpy.stages import TrajectoryExecutor
+
+from helpers import open_stage, close
+
+
+def points(count, step = 0.05):
+    for i in range(count):
+        yield step * (i + 1)
+
+
+def test_run(controller):
+    port, stage = open_stage(controller)
+    try:
+        result = TrajectoryExecutor(stage, points(5), timeout = 10).run()
+        assert result.points == 5
+        assert result.position == pytest.approx(0.25, abs = 1e-4)
+        assert result.elapsed > 0 and result.points_per_second > 0
+    finally:
+        close(port)
+
+
+def test_callback(controller):
+    port, stage = open_stage(controller)
+    try:
+        reached = []
+        def callback(index, position):
+            assert threading.current_thread() is threading.main_thread()
+            reached.append((index, position))
+        result = TrajectoryExecutor(stage, points(3), callback, timeout = 10).run()
+        assert [i for i, position in reached] == [0, 1, 2]
+        assert [position for i, position in reached] == pytest.approx([0.05, 0.1, 0.15], abs = 1e-4)
+        assert result.points == 3
+    finally:
+        close(port)
+
+
+def test_stop(controller):
+    port, stage = open_stage(controller)
+    try:
+        executor = None
+        def callback(index, position):
+            if index == 1:
+                executor.stop()
+        #Endless trajectory
+        executor = TrajectoryExecutor(stage, points(10 ** 9, 0.001), callback, timeout = 10)
+        result = executor.run()
+        assert result.points == 2
+    finally:
+        close(port)
+
+
+def test_empty(controller):
+    port, stage = open_stage(controller)
+    try:
+        result = TrajectoryExecutor(stage, []).run()
+        assert result.points == 0 and result.position is None
+    finally:
+        close(port)
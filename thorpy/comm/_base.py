@@ -1 +1,124 @@
+import threading
 
+class ReplyWaiters:
+    """Futures waiting for messages from a controller.
+    
+    Each future is registered with the classes of the messages it waits for
+    (and optionally a channel), and is resolved with the first matching
+    message received. Works with :class:`concurrent.futures.Future` as well as
+    :class:`asyncio.Future`."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        #List of (message classes, chan_ident, future)
+        self._waiters = []
+        
+    def add(self, classes, chan_ident, future):
+        with self._lock:
+            self._waiters.append((tuple(classes), chan_ident, future))
+        return future
+    
+    def resolve(self, msg):
+        """Resolve the futures waiting for msg. Returns True if there was at
+        least one."""
+        resolved = []
+        with self._lock:
+            waiters = []
+            for classes, chan_ident, future in self._waiters:
+                if future.done():
+                    #Cancelled
+                    continue
+                if isinstance(msg, classes) and (chan_ident is None or msg['chan_ident'] == chan_ident):
+                    resolved.append(future)
+                else:
+                    waiters.append((classes, chan_ident, future))
+            self._waiters = waiters
+        
+        #Done outside of the lock, callbacks may register new futures
+        for future in resolved:
+            future.set_result(msg)
+        return len(resolved) > 0
+    
+    def cancel_all(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for classes, chan_ident, future in waiters:
+            future.cancel()
+            
+    def __len__(self):
+        with self._lock:
+            return len([w for w in self._waiters if not w[2].done()])
+
+
+class MessageDispatcher:
+    """Handling of the incoming messages, shared by the transports
+    (:class:`~thorpy.comm.port.Port` and
+    :class:`~thorpy.comm.asyncport.AsyncPort`).
+    
+    Needs _port (name of the serial port), _waiters (:class:`ReplyWaiters`),
+    and the methods _handle_message and _unhandled_message."""
+    
+    def _dispatch_messages(self, next_message):
+        """Handle all the messages returned by next_message(), until it
+        returns None: by the stages first, then by the futures waiting for
+        them. Invalid messages are reported and skipped."""
+        while True:
+            try:
+                msg = next_message()
+            except ValueError as e:
+                #Unknown or invalid message: skipped by the parser, go on with the next ones
+                print("Invalid message from {0}: {1}".format(self._port, e))
+                continue
+            if msg is None:
+                break
+            message_handled = self._handle_message(msg)
+            #After handling, so that the stage state is up to date when the futures are resolved
+            if self._waiters.resolve(msg):
+                message_handled = True
+            if not message_handled:
+                self._unhandled_message(msg)
+
+
+class SingleControllerMixin:
+    """Addressing and stages of a single controller (not a card slot
+    controller), shared by the transports.
+    
+    Needs _stages (chan_ident -> stage) and _info_message."""
+    
+    def encode_message(self, msg):
+        """Return the frame sent for msg, addressed to the controller."""
+        msg['source'] = 0x01
+        msg['dest'] = 0x50
+        return msg.bytes
+    
+    def _handle_message(self, msg):
+        #Is it a channel message? In that case the stage object has to handle it
+        if 'chan_ident' in msg:
+            try:
+                return self._stages[msg['chan_ident']]._handle_message(msg)
+            except KeyError:
+                #Keep messages to stages that don't exist
+                return False
+        
+        #This is a system message, handle it ourselves
+        
+        #Not handled
+        return False
+    
+    def _generic_stages(self, only_chan_idents = None):
+        """Return a dict chan_ident -> :class:`~thorpy.stages.GenericStage`,
+        constructing the stages not used yet."""
+        from thorpy.stages import stage_name_from_get_hw_info, GenericStage
+        if only_chan_idents is None:
+            only_chan_idents = [0x01]
+        
+        assert all(x == 1 for x in only_chan_idents)
+        
+        ret = {}
+        for k in only_chan_idents:
+            stage = self._stages.get(k, None)
+            if stage is None:
+                stage = GenericStage(self, 0x01, stage_name_from_get_hw_info(self._info_message))
+                self._stages[k] = stage
+            ret[k] = stage
+        return ret
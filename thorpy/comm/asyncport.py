@@ -0,0 +1,138 @@
+import asyncio
+import weakref
+
+import serial
+
+from ._base import ReplyWaiters, MessageDispatcher, SingleControllerMixin
+
+class AsyncPort(SingleControllerMixin, MessageDispatcher):
+    """Port driven by an :mod:`asyncio` event loop, instead of a worker thread.
+
+    The serial port file descriptor is watched by the event loop, and incoming
+    messages are handled from the loop as soon as they are parsed. Only
+    single controllers (not card slot controllers) are supported.
+
+    Use :meth:`create` to open a port::
+
+        port = await AsyncPort.create('/dev/ttyUSB0', '83000001')
+        stage = port.get_stages()[1]
+        await stage.move_to(10)
+
+    :param trusted: see :attr:`thorpy.comm.port.Port.trusted`"""
+
+    def __init__(self, port, sn, trusted = False, loop = None):
+        from ..message import FrameParser
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._parser = FrameParser(validate = not trusted)
+        self._unhandled_messages = asyncio.Queue()
+        self._waiters = ReplyWaiters()
+        self._serial = serial.Serial(port, 115200, serial.EIGHTBITS, serial.PARITY_NONE, serial.STOPBITS_ONE, timeout = 0)
+        self._port = port
+        self._serial_number = int(sn)
+        self._debug = False
+        self._info_message = None
+        self._stages = weakref.WeakValueDictionary()
+        self._loop.add_reader(self._serial.fileno(), self._on_readable)
+
+    @classmethod
+    async def create(cls, port, sn, trusted = False, timeout = 1, retries = 3):
+        """Open port and do the initial handshake with the controller.
+
+        :param timeout: time to wait for the hardware information, in seconds
+        :param retries: number of times the hardware information is requested
+        :raises TimeoutError: if the controller doesn't answer"""
+        from ..message import MGMSG_HW_NO_FLASH_PROGRAMMING, MGMSG_HW_REQ_INFO, MGMSG_HW_GET_INFO, MGMSG_HW_START_UPDATEMSGS, MGMSG_HW_STOP_UPDATEMSGS
+        self = cls(port, sn, trusted)
+        try:
+            self.send_message(MGMSG_HW_NO_FLASH_PROGRAMMING())
+            self.send_message(MGMSG_HW_STOP_UPDATEMSGS())
+
+            for i in range(retries):
+                try:
+                    self._info_message = await self.request(MGMSG_HW_REQ_INFO(), (MGMSG_HW_GET_INFO, ), timeout = timeout)
+                    break
+                except asyncio.TimeoutError:
+                    self._parser.clear()
+            else:
+                raise TimeoutError("No answer to MGMSG_HW_REQ_INFO from {0!r}".format(self))
+
+            self.send_message(MGMSG_HW_START_UPDATEMSGS(update_rate = 1))
+        except:
+            self.close()
+            raise
+
+        print("Constructed: {0!r}".format(self))
+        return self
+
+    def close(self):
+        """Stop watching the serial port and close it."""
+        if self._serial.isOpen():
+            self._loop.remove_reader(self._serial.fileno())
+            self._serial.close()
+        self._waiters.cancel_all()
+
+    def fileno(self):
+        return self._serial.fileno()
+
+    def send_message(self, msg):
+        frame = self.encode_message(msg)
+        if self._debug:
+            print('> ', msg)
+        self._serial.write(frame)
+
+    def expect(self, classes, chan_ident = None):
+        """Return a future, resolved with the next incoming message which is an
+        instance of one of classes (and is for channel chan_ident, if not None).
+        The message is still handled normally afterwards."""
+        return self._waiters.add(classes, chan_ident, self._loop.create_future())
+
+    async def request(self, msg, reply_classes, chan_ident = None, timeout = None):
+        """Send msg, and return the reply (see :meth:`expect`).
+
+        :raises asyncio.TimeoutError: if no reply is received within timeout seconds"""
+        future = self.expect(reply_classes, chan_ident)
+        self.send_message(msg)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            future.cancel()
+
+    async def recv_message(self):
+        """Return the next message which was not handled by a stage."""
+        return await self._unhandled_messages.get()
+
+    def _on_readable(self):
+        try:
+            data = self._serial.read(max(1, self._serial.inWaiting()))
+        except OSError:
+            #The device is gone
+            self.close()
+            return
+
+        self._parser.feed(data)
+        self._dispatch_messages(self._next_message)
+
+    def _next_message(self):
+        msg = self._parser.next_message()
+        if msg is not None and self._debug:
+            print('< ', msg)
+        return msg
+
+    def _unhandled_message(self, msg):
+        self._unhandled_messages.put_nowait(msg)
+
+    @property
+    def serial_number(self):
+        return self._serial_number
+
+    @property
+    def channel_count(self):
+        return self._info_message['nchs']
+
+    def get_stages(self, only_chan_idents = None):
+        """Return a dict chan_ident -> :class:`~thorpy.stages.AsyncStage`."""
+        from thorpy.stages import AsyncStage
+        return dict((k, AsyncStage(stage)) for k, stage in self._generic_stages(only_chan_idents).items())
+
+    def __repr__(self):
+        return '{0}({1!r},{2!r})'.format(self.__class__.__name__, self._port, self._serial_number)
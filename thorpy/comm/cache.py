@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import threading
+
+class DiscoveryCache:
+    """On-disk cache of the controllers found by discovery: USB serial number
+    -> serial port and hardware information (MGMSG_HW_GET_INFO).
+
+    Entries are validated cheaply, without talking to the controller: the
+    serial port must exist, and (when sysfs is available) the USB device
+    behind it must still have the same serial number.
+
+    :param path: cache file, by default thorpy/discovery.json in
+        $XDG_CACHE_HOME (~/.cache)"""
+
+    def __init__(self, path = None):
+        if path is None:
+            cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+            path = os.path.join(cache_home, 'thorpy', 'discovery.json')
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.load()
+
+    def load(self):
+        """(Re)load the cache file. A missing or corrupted file gives an empty cache."""
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        with self._lock:
+            self._entries = entries if isinstance(entries, dict) else {}
+
+    def save(self):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok = True)
+        #Atomic replace, so that concurrent processes never read a partial file.
+        #Locked, so that threads saving concurrently replace it in order
+        with self._lock:
+            data = json.dumps(self._entries, indent = 1, sort_keys = True)
+            fd, tmp = tempfile.mkstemp(prefix = os.path.basename(self.path) + '.', suffix = '.tmp', dir = directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+            except:
+                os.remove(tmp)
+                raise
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def serial_numbers(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def get(self, serial_number):
+        """Return (serial port, MGMSG_HW_GET_INFO message, stage name) for
+        serial_number, or None if unknown or not valid anymore."""
+        from ..message import Message
+        with self._lock:
+            entry = self._entries.get(serial_number, None)
+        if entry is None or not self.is_valid(serial_number, entry['port']):
+            return None
+        try:
+            info = Message.parse(bytes.fromhex(entry['info']))
+        except Exception:
+            return None
+        return entry['port'], info, entry.get('stage_name', None)
+
+    def set(self, serial_number, port, info, stage_name = None):
+        with self._lock:
+            self._entries[serial_number] = {
+                'port': port,
+                'info': info.bytes.hex(),
+                'stage_name': stage_name,
+            }
+
+    def remove(self, serial_number):
+        with self._lock:
+            self._entries.pop(serial_number, None)
+
+    @staticmethod
+    def is_valid(serial_number, port):
+        """Check that port exists, and is still the device with serial_number."""
+        from .sysfs import usb_attributes
+        if not os.path.exists(port):
+            return False
+        attributes = usb_attributes(port)
+        if attributes is None:
+            #Not an USB device, or no sysfs: can't tell
+            return True
+        return attributes['serial'] == serial_number
@@ -1,32 +1,196 @@
-def discover_stages():
+import threading
+import weakref
+
+def find_ports():
+    """Return a list of (serial port, serial number) of the Thorlabs controllers
+    connected by USB.
+    
+    Uses sysfs on Linux (no device I/O), pyusb elsewhere."""
+    from . import sysfs
+    if sysfs.available():
+        return find_ports_sysfs()
+    return find_ports_pyusb()
+
+def find_ports_sysfs(root = '/sys'):
+    """:func:`find_ports` reading sysfs attributes only (Linux)."""
+    from . import sysfs
+    return [(port, attributes['serial']) for port, attributes in sysfs.list_ports(root)
+            if attributes['manufacturer'] == 'Thorlabs' and attributes['serial'] is not None]
+
+def find_ports_pyusb():
+    """:func:`find_ports` enumerating the USB devices with pyusb, and matching
+    them with the serial ports."""
     import usb
-    import os
-    from .port import Port
     from serial.tools.list_ports import comports
     import platform
-    
+
     serial_ports = [(x[0], x[1], dict(y.split('=', 1) for y in x[2].split(' ') if '=' in y)) for x in comports()]
-    
+
+    ret = []
     for dev in usb.core.find(find_all=True, custom_match= lambda x: x.bDeviceClass != 9):
         if dev.manufacturer != 'Thorlabs':
             continue
-        
+
         if platform.system() == 'Linux':
             port_candidates = [x[0] for x in serial_ports if x[2].get('SER', None) == dev.serial_number]
         else:
             raise NotImplementedError("Implement for platform.system()=={0}".format(platform.system()))
-        
+
         assert len(port_candidates) == 1
-        
-        port = port_candidates[0]
 
-        p = Port.create(port, dev.serial_number)
+        ret.append((port_candidates[0], dev.serial_number))
+    return ret
+
+def discover_stages():
+    from .port import Port
+
+    for port, serial_number in find_ports():
+        p = Port.create(port, serial_number)
         for stage in p.get_stages().values():
             yield stage
-        
-if __name__ == '__main__':
-    print(list(discover()))
+
+def discover_stages_parallel(timeout = 1, retries = 3, max_workers = None, reactor = None, ports = None):
+    """Open all controllers concurrently, and return the list of their stages
+    once all of them are ready.
+
+    A controller which doesn't answer (or fails) is skipped with a message,
+    without delaying the others more than timeout * retries seconds.
+
+    :param timeout: seconds to wait for the hardware information of each port
+    :param retries: number of times the hardware information is requested
+    :param max_workers: number of ports opened at the same time (default: all)
+    :param reactor: see :meth:`thorpy.comm.port.Port.create`
+    :param ports: list of (serial port, serial number), default :func:`find_ports`"""
+    from .port import Port
+    import concurrent.futures
+    import sys
+
+    if ports is None:
+        ports = find_ports()
+    if len(ports) == 0:
+        return []
+
+    def open_port(port, serial_number):
+        p = Port.create(port, serial_number, reactor = reactor, timeout = timeout, retries = retries)
+        return list(p.get_stages().values())
+
+    stages = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers = max_workers or len(ports)) as executor:
+        futures = [(port, executor.submit(open_port, port, serial_number)) for port, serial_number in ports]
+        for port, future in futures:
+            try:
+                stages.extend(future.result())
+            except Exception as e:
+                print("Skipping {0}: {1!r}".format(port, e), file = sys.stderr)
+    return stages
+
+def discover_stages_cached(cache = None, rescan = False, timeout = 1, retries = 3, reactor = None, ports = None):
+    """Return the list of stages, using the controllers known from a previous
+    run to avoid the USB enumeration and the handshakes.
+    
+    Stages of cached controllers are constructed immediately, their hardware
+    information being checked in the background: an entry is removed from the
+    cache if the controller doesn't answer, or doesn't match.
+    
+    The controllers are also enumerated, and those not cached yet opened
+    (and added to the cache). Without sysfs, where the enumeration is
+    expensive, this is only done if no cached controller is available, or if
+    rescan is True.
     
+    :param cache: :class:`~thorpy.comm.cache.DiscoveryCache`, by default the
+        one of the user
+    :param rescan: enumerate the controllers even if some are cached, and
+        sysfs isn't available
+    :param timeout: see :func:`discover_stages_parallel`
+    :param retries: see :func:`discover_stages_parallel`
+    :param reactor: see :meth:`thorpy.comm.port.Port.create`
+    :param ports: list of (serial port, serial number), default :func:`find_ports`"""
+    from .port import Port
+    from .cache import DiscoveryCache
+    from . import sysfs
+    import sys
+    
+    if cache is None:
+        cache = DiscoveryCache()
+    
+    stages = []
+    known = set()
+    for serial_number in cache.serial_numbers():
+        entry = cache.get(serial_number)
+        if entry is None:
+            cache.remove(serial_number)
+            continue
+        port, info, stage_name = entry
+        try:
+            p = Port.create(port, serial_number, reactor = reactor, timeout = timeout, retries = retries, info = info)
+        except Exception as e:
+            print("Skipping {0}: {1!r}".format(port, e), file = sys.stderr)
+            cache.remove(serial_number)
+            continue
+        stages.extend(p.get_stages().values())
+        _verify_in_background(cache, serial_number, p, timeout * retries)
+        known.add(port)
+    
+    #sysfs enumeration is cheap (no device I/O): always look for new controllers
+    if len(known) == 0 or rescan or ports is not None or sysfs.available():
+        if ports is None:
+            ports = find_ports()
+        new_ports = [(port, serial_number) for port, serial_number in ports if port not in known]
+        serial_numbers = dict(new_ports)
+        new_stages = discover_stages_parallel(timeout, retries, reactor = reactor, ports = new_ports)
+        for stage in new_stages:
+            p = stage._port
+            cache.set(serial_numbers[p._port], p._port, p._info_message, stage._name)
+        stages.extend(new_stages)
+    
+    cache.save()
+    return stages
+
+def _verify_in_background(cache, serial_number, port, timeout):
+    """Update the cache entry of port once the controller has sent its
+    hardware information. If the information doesn't match, or the controller
+    doesn't answer within timeout, the entry is removed and the port is
+    closed, dropping its stale stages."""
+    from ..stages import stage_name_from_get_hw_info
+    import sys
+    
+    verification = port.verification
+    port_name = port._port
+    port_ref = weakref.ref(port)
+    
+    def verified(future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print("{0}, removed from the discovery cache".format(future.exception()), file = sys.stderr)
+            port = port_ref()
+            if port is not None:
+                port.close()
+            cache.remove(serial_number)
+            cache.save()
+            return
+        info = future.result()
+        cache.set(serial_number, port_name, info, stage_name_from_get_hw_info(info))
+        cache.save()
+    
+    def expire():
+        #Only succeeds if the controller didn't answer
+        if verification.cancel():
+            print("No answer from {0}, removed from the discovery cache".format(port_name), file = sys.stderr)
+            port = port_ref()
+            if port is not None:
+                port.close()
+            cache.remove(serial_number)
+            cache.save()
+    
+    verification.add_done_callback(verified)
+    t = threading.Timer(timeout, expire)
+    t.daemon = True
+    t.start()
+
+if __name__ == '__main__':
+    print(list(discover_stages()))
+
 
 #iManufacturer           1 Thorlabs
 #    iProduct                2 APT DC Motor Controller
@@ -0,0 +1,131 @@
+import threading
+import traceback
+import weakref
+
+class HotplugWatcher:
+    """Watches the controllers being connected and disconnected, by polling
+    :func:`~thorpy.comm.discovery.find_ports` (sysfs on Linux, cheap).
+
+    When a controller disappears, its :class:`~thorpy.comm.port.Port` is
+    closed. When it comes back, a new port is created and the stages which
+    were using the old one are moved to it, with the velocity and homing
+    parameters set by the user applied again: existing
+    :class:`~thorpy.stages.GenericStage` objects keep working.
+
+    Listeners are called from the watcher thread, with (event, serial port,
+    serial number), event being 'attach' or 'detach'::
+
+        watcher = HotplugWatcher()
+        watcher.add_listener(lambda event, port, sn: print(event, port, sn))
+        watcher.start()
+
+    :param interval: seconds between two polls
+    :param find_ports: function returning the list of (serial port, serial
+        number) connected, by default :func:`~thorpy.comm.discovery.find_ports`
+    :param reactor: see :meth:`thorpy.comm.port.Port.create`"""
+
+    def __init__(self, interval = 0.2, find_ports = None, reactor = None):
+        if find_ports is None:
+            from .discovery import find_ports
+        self.interval = interval
+        self._find_ports = find_ports
+        self._reactor = reactor
+        self._listeners = []
+        self._present = set(find_ports())
+        #Serial number -> {chan_ident: weak reference to stage} of detached controllers
+        self._orphan_stages = {}
+        #(serial port, serial number) which couldn't be attached yet, tried again on each poll
+        self._retry = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target = self.run, name = 'thorpy hotplug', daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                traceback.print_exc()
+
+    def poll(self):
+        """Check for changes once, handling and reporting them."""
+        from .port import Port
+        present = set(self._find_ports())
+        
+        #Power-cycled faster than the polling: same port, but the old one is dead
+        lost = set()
+        with Port.static_port_list_lock:
+            for port, serial_number in present & self._present:
+                if port in Port.static_lost_port_list:
+                    lost.add((port, serial_number))
+        
+        for port, serial_number in sorted((self._present - present) | lost):
+            self._retry.discard((port, serial_number))
+            self._detach(port, serial_number)
+            self._notify('detach', port, serial_number)
+        attached = (present - self._present) | lost | (self._retry & present)
+        self._retry &= present
+        self._present = present
+        for port, serial_number in sorted(attached):
+            try:
+                self._attach(port, serial_number)
+            except Exception:
+                #E.g. the tty appeared before the controller answers: don't hold up the others
+                traceback.print_exc()
+                self._retry.add((port, serial_number))
+                continue
+            self._retry.discard((port, serial_number))
+            self._notify('attach', port, serial_number)
+
+    def _notify(self, event, port, serial_number):
+        for listener in list(self._listeners):
+            try:
+                listener(event, port, serial_number)
+            except Exception:
+                traceback.print_exc()
+
+    def _detach(self, port, serial_number):
+        from .port import Port
+        with Port.static_port_list_lock:
+            p = Port.static_lost_port_list.get(port, None)
+            if p is None:
+                p = Port.static_port_list.get(port, None)
+        if p is None:
+            return
+        self._orphan_stages[serial_number] = dict((k, weakref.ref(v)) for k, v in p._stages.items())
+        p.close()
+
+    def _attach(self, port, serial_number):
+        from .port import Port
+        stages = self._orphan_stages.pop(serial_number, {})
+        stages = dict((k, s()) for k, s in stages.items())
+        stages = dict((k, s) for k, s in stages.items() if s is not None)
+        if len(stages) == 0:
+            #Nobody was using it
+            return
+
+        try:
+            p = Port.create(port, serial_number, reactor = self._reactor)
+        except Exception:
+            #Keep the stages for the next time it is attached
+            self._orphan_stages[serial_number] = dict((k, weakref.ref(s)) for k, s in stages.items())
+            raise
+        for k, s in stages.items():
+            s._reattach(p)
+            p._stages[k] = s
@@ -1,47 +1,68 @@
 import serial
 import select
+import socket
 import threading
 import time
 import queue
 import weakref
+import concurrent.futures
 
-class Port:
+from ._base import ReplyWaiters, MessageDispatcher, SingleControllerMixin
+
+class Port(MessageDispatcher):
     #List to make "quasi-singletons"
     static_port_list = weakref.WeakValueDictionary()
     static_port_list_lock = threading.RLock()
+    #Ports whose device is gone, until closed (e.g. by a HotplugWatcher)
+    static_lost_port_list = weakref.WeakValueDictionary()
+    #One lock per serial port being created, so that different ports can be created concurrently
+    static_port_creation_locks = {}
     
-    def __init__(self, port, sn):
+    def __init__(self, port, sn, trusted = False, reactor = None, timeout = 1, retries = 3, settle_time = 0, info = None):
         super().__init__()
+        start_time = time.perf_counter()
         self._lock = threading.RLock()
         self._lock.acquire()
-        self._buffer = b''
+        from ..message import FrameParser
+        #Skip validation of incoming messages if trusted
+        self._parser = FrameParser(validate = not trusted)
         self._unhandled_messages = queue.Queue()
+        self._waiters = ReplyWaiters()
         self._serial = serial.Serial(port, 115200, serial.EIGHTBITS, serial.PARITY_NONE, serial.STOPBITS_ONE)
         self._port = port
         self._debug = False
+        self._closed = False
+        #Set when the device is gone
+        self._lost = False
         
-        from ..message import MGMSG_HW_NO_FLASH_PROGRAMMING, MGMSG_HW_REQ_INFO, MGMSG_HW_START_UPDATEMSGS, MGMSG_HW_STOP_UPDATEMSGS
-        self.send_message(MGMSG_HW_NO_FLASH_PROGRAMMING(source = 0x01, dest = 0x50))
-        self.send_message(MGMSG_HW_STOP_UPDATEMSGS())
+        from ..message import MGMSG_HW_NO_FLASH_PROGRAMMING, MGMSG_HW_REQ_INFO, MGMSG_HW_GET_INFO, MGMSG_HW_START_UPDATEMSGS, MGMSG_HW_STOP_UPDATEMSGS
+        try:
+            self.send_message(MGMSG_HW_NO_FLASH_PROGRAMMING(source = 0x01, dest = 0x50))
+            self.send_message(MGMSG_HW_STOP_UPDATEMSGS())
+            if info is None:
+                self._info_message = self._handshake(timeout, retries)
+                self._verification = concurrent.futures.Future()
+                self._verification.set_result(self._info_message)
+            else:
+                #Known from a previous session, checked in the background
+                self._info_message = info
+                self._verification = concurrent.futures.Future()
+                reply = self.expect((MGMSG_HW_GET_INFO, ))
+                self_ref = weakref.ref(self)
+                verification = self._verification
+                reply.add_done_callback(lambda future: Port._check_verification(self_ref(), verification, future))
+                verification.add_done_callback(lambda future: reply.cancel())
+        except:
+            self._lock.release()
+            self._serial.close()
+            raise
         
-        self._info_message = None
-        while self._info_message is None:
-            self.send_message(MGMSG_HW_REQ_INFO())
-            try:
-                self._info_message = self._recv_message(blocking = True)
-            except:
-                self._buffer = b''
-                #Flush port if needed
-                old_timeout = self._serial.timeout
-                self._serial.setTimeout(1)
-                self._serial.read(1024)
-                self._serial.setTimeout(old_timeout)                
-                
         self._serial_number = int(sn)
         if self._serial_number is None:
             self._serial_number = self._info_message['serial_number']
             
-        time.sleep(1)
+        if settle_time > 0:
+            time.sleep(settle_time)
             
         self.send_message(MGMSG_HW_START_UPDATEMSGS(update_rate = 1))
             
@@ -49,25 +70,185 @@ class Port:
         
         self._lock.release()
         self.daemon = False
+        self._startup_time = time.perf_counter() - start_time
         print("Constructed: {0!r}".format(self))
         
-        self._thread_main = threading.current_thread()
-        self._thread_worker_initialized = threading.Event()
-        self._thread_worker = threading.Thread(target = Port.run, args = (weakref.proxy(self), ))
-        self._thread_worker.start()
+        self._reactor = reactor
+        if self._reactor is not None:
+            #The reactor thread handles incoming messages
+            self._reactor_fd = self._reactor.register(self)
+        else:
+            #Runs until close(), or until the main thread ends (not the thread creating
+            #the port, which may be short-lived, e.g. a worker of discover_stages_parallel)
+            self._thread_main = threading.main_thread()
+            #Written to by close(), to wake the worker up
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
+            self._thread_worker_initialized = threading.Event()
+            self._thread_worker = threading.Thread(target = Port.run, args = (weakref.proxy(self), ))
+            self._thread_worker.start()
+            
+            self._thread_worker_initialized.wait()
         
-        self._thread_worker_initialized.wait()
+        if not self._verification.done():
+            Port._request_info(weakref.ref(self), timeout, retries)
         
 
     def __del__(self):
+        if not hasattr(self, '_startup_time'):
+            #Construction failed
+            return
         print("Destructed: {0!r}".format(self))
-        self._thread_worker.join()
+        self.close()
+    
+    def close(self):
+        """Stop handling the port, and close it. The port is removed from
+        the ports returned by :meth:`create`."""
+        with Port.static_port_list_lock:
+            if Port.static_port_list.get(self._port, None) is self:
+                del Port.static_port_list[self._port]
+            if Port.static_lost_port_list.get(self._port, None) is self:
+                del Port.static_lost_port_list[self._port]
+        if self._closed:
+            return
+        self._closed = True
+        self._waiters.cancel_all()
+        if self._reactor is not None:
+            self._reactor.unregister(self._reactor_fd)
+            #The reactor thread may be reading it until the unregistration is processed
+            with self._lock:
+                self._serial.close()
+        else:
+            #Stop the worker thread, which closes the serial port
+            self._continue = False
+            self._wakeup_w.send(b'\x00')
+            if threading.current_thread() is not self._thread_worker:
+                self._thread_worker.join()
+                self._wakeup_r.close()
+                self._wakeup_w.close()
+    
+    @property
+    def closed(self):
+        return self._closed
+    
+    @property
+    def lost(self):
+        """True if the device was found to be gone (e.g. unplugged)."""
+        return self._lost
+    
+    def _set_lost(self):
+        """The device is gone: stop waiting for replies (which ends the pending
+        motions), and let :meth:`create` open the serial port again."""
+        self._lost = True
+        with Port.static_port_list_lock:
+            if Port.static_port_list.get(self._port, None) is self:
+                del Port.static_port_list[self._port]
+                Port.static_lost_port_list[self._port] = self
+        self._waiters.cancel_all()
+            
+    def _handshake(self, timeout, retries):
+        """Request the hardware information, and return it as soon as it is
+        received.
+        
+        :param timeout: seconds to wait for an answer to each request
+        :param retries: number of requests sent before giving up
+        :raises TimeoutError: if the controller doesn't answer"""
+        from ..message import MGMSG_HW_REQ_INFO, MGMSG_HW_GET_INFO
+        for i in range(retries):
+            self.send_message(MGMSG_HW_REQ_INFO())
+            deadline = time.perf_counter() + timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    msg = self._parser.next_message()
+                except ValueError:
+                    #Unknown message, or garbage from a previous session (skipped by the parser)
+                    continue
+                if isinstance(msg, MGMSG_HW_GET_INFO):
+                    return msg
+                if msg is not None:
+                    #Messages sent before the updates were stopped
+                    continue
+                
+                r, w, e = select.select([self._serial], [], [], remaining)
+                if len(r) > 0:
+                    self._recv()
+            
+            #Start again from a clean state
+            self._parser.clear()
+            self._serial.flushInput()
+        
+        raise TimeoutError("No answer to MGMSG_HW_REQ_INFO from {0} after {1} tries".format(self._port, retries))
+    
+    @staticmethod
+    def _request_info(self_ref, timeout, retries):
+        """Send MGMSG_HW_REQ_INFO until the verification is done, up to retries
+        times, every timeout seconds. Only holds a weak reference to the port."""
+        from ..message import MGMSG_HW_REQ_INFO
+        self = self_ref()
+        if self is None or self._closed or self._verification.done():
+            return
+        try:
+            self.send_message(MGMSG_HW_REQ_INFO())
+        except OSError:
+            return  #The device is gone
+        if retries > 1:
+            t = threading.Timer(timeout, Port._request_info, args = (self_ref, timeout, retries - 1))
+            t.daemon = True
+            t.start()
+    
+    @staticmethod
+    def _check_verification(self, verification, reply):
+        """Resolve verification with the MGMSG_HW_GET_INFO received, or set
+        ValueError if it doesn't match the known hardware information."""
+        if self is None or reply.cancelled():
+            verification.cancel()
+            return
+        if not verification.set_running_or_notify_cancel():
+            return
+        info = reply.result()
+        if info['serial_number'] != self._info_message['serial_number'] or info['empty_space'] != self._info_message['empty_space']:
+            verification.set_exception(ValueError("Hardware information of {0!r} changed: {1}".format(self, info)))
+            return
+        self._info_message = info
+        verification.set_result(info)
+    
+    @property
+    def verification(self):
+        """:class:`concurrent.futures.Future` resolved with the hardware
+        information sent by the controller.
+        
+        Already done, unless the port was created with a known hardware
+        information (info parameter), in which case it is requested in the
+        background: up to retries times, every timeout seconds (see
+        :meth:`create`). If the controller sends a different serial number
+        or stage type, ValueError is set instead: the stages of the port are
+        not the right ones."""
+        return self._verification
+    
+    @property
+    def startup_time(self):
+        """Seconds spent constructing the port (opening it and doing the
+        handshake with the controller)."""
+        return self._startup_time
             
+    def encode_message(self, msg):
+        """Return the frame sent for msg, addressed to the controller, to be
+        written later with :meth:`send_bytes`."""
+        return msg.bytes
+    
+    def send_bytes(self, frame):
+        """Write frames encoded by :meth:`encode_message`."""
+        with self._lock:
+            self._serial.write(frame)
+    
     def send_message(self, msg):
+        frame = self.encode_message(msg)
         with self._lock:
             if self._debug:
                 print('> ', msg)
-            self._serial.write(msg.bytes)
+            self._serial.write(frame)
             
     @staticmethod
     def run(self):
@@ -76,36 +257,79 @@ class Port:
             timeout = 1
             self._thread_worker_initialized.set()
             
-            while self._thread_main.is_alive():
-                #Trick to avoid holding lock
-                r, w, e = select.select([self._serial], [], [], timeout)
-                msg = self._recv_message(False)
-                if msg is not None:
-                    message_handled = self._handle_message(msg)
-                    if not message_handled:
-                        print("Unhandled message", msg)
-                        self._unhandled_messages.put(msg)
+            while self._continue and self._thread_main.is_alive():
+                try:
+                    #Trick to avoid holding lock
+                    r, w, e = select.select([self._serial, self._wakeup_r], [], [], timeout)
+                    if not self._continue:
+                        break
+                    self._service()
+                except OSError as e:
+                    #The device is gone (unplugged, powered off)
+                    print("Lost {0}: {1}".format(self._port, e))
+                    self._set_lost()
+                    break
                         
             self._serial.close()
         except ReferenceError:
             pass  #Object deleted
-
+    
+    def _service(self):
+        """Read everything available at once, and handle all complete messages."""
+        self._dispatch_messages(lambda: self._recv_message(False))
+    
+    def _unhandled_message(self, msg):
+        print("Unhandled message", msg)
+        self._unhandled_messages.put(msg)
         
-    def _recv(self, l = 1, blocking = False):
+    def _recv(self, l = None, blocking = False):
+        """Read data from the serial port into the parser. By default, read
+        everything available (at least one byte)."""
         with self._lock:
+            if not self._serial.isOpen():
+                #Closed, e.g. while the reactor was servicing it
+                return 0
             if not blocking:
                 r, w, e = select.select([self._serial], [], [], 0)
                 if len(r) == 0:
                     return 0
-                
+            
+            if l is None:
+                l = max(1, self._serial.inWaiting())
             new_data = self._serial.read(l)
-            self._buffer += new_data
+            self._parser.feed(new_data)
             return len(new_data)
         
         
     def fileno(self):
         with self._lock:
             return self._serial.fileno()
+    
+    def expect(self, classes, chan_ident = None):
+        """Return a :class:`concurrent.futures.Future`, resolved with the next
+        incoming message which is an instance of one of classes (and is for
+        channel chan_ident, if not None).
+        
+        The future is resolved by the thread handling the port, right after the
+        message was handled (e.g. after the stage state was updated). Cancel it
+        if the message is not waited for anymore."""
+        return self._waiters.add(classes, chan_ident, concurrent.futures.Future())
+    
+    def request(self, msg, reply_classes = None, chan_ident = None, timeout = None):
+        """Send msg, and return the reply (see :meth:`expect`).
+        
+        :param reply_classes: classes of the reply, by default
+            msg.reply_classes()
+        :raises concurrent.futures.TimeoutError: if no reply is received within
+            timeout seconds"""
+        if reply_classes is None:
+            reply_classes = msg.reply_classes()
+        future = self.expect(reply_classes, chan_ident)
+        self.send_message(msg)
+        try:
+            return future.result(timeout)
+        finally:
+            future.cancel()
         
     def recv_message(self, block = True, timeout = None):
         try:
@@ -115,26 +339,20 @@ class Port:
     
     def _recv_message(self, blocking = False, timeout = None):
         with self._lock:
-            from ..message import Message, IncompleteMessageException
-            msg = None
             start_time = time.time()
+            msg = self._parser.next_message()
             while msg is None:
-                try:
-                    msg = Message.parse(self._buffer)
-                except IncompleteMessageException:
-                    msg = None
-                    length = self._recv(blocking = blocking)
-                    
-                    #We were not able to read data
-                    if length == 0 and not blocking:
-                        return None
-                    
-                    #Passed timeout...
-                    if blocking and timeout is not None and start_time < time.time() - timeout:
-                        return None
-                    
-            
-            self._buffer = self._buffer[len(msg):]
+                length = self._recv(blocking = blocking)
+                
+                #We were not able to read data
+                if length == 0 and not blocking:
+                    return None
+                
+                #Passed timeout...
+                if blocking and timeout is not None and start_time < time.time() - timeout:
+                    return None
+                
+                msg = self._parser.next_message()
             
             if self._debug:
                 print('< ', msg)
@@ -144,6 +362,16 @@ class Port:
     def serial_number(self):
         return self._serial_number
     
+    @property
+    def trusted(self):
+        """If True, messages received from the controller are decoded without
+        validating their fields (faster). Messages sent are always validated."""
+        return not self._parser.validate
+    
+    @trusted.setter
+    def trusted(self, value):
+        self._parser.validate = not value
+    
     @property
     def channel_count(self):
         #_info_message is immutable, no worries about lock
@@ -159,38 +387,58 @@ class Port:
         return {}
     
     @classmethod
-    def create(cls, port, sn):
+    def create(cls, port, sn, trusted = False, reactor = None, timeout = 1, retries = 3, settle_time = 0, info = None):
+        """Return the port object for port, creating it if needed.
+        
+        :param port: serial port (e.g. /dev/ttyUSB0)
+        :param sn: serial number of the controller
+        :param trusted: see :attr:`Port.trusted`
+        :param reactor: if not None, a :class:`~thorpy.comm.reactor.Reactor`
+            servicing the port, instead of a worker thread per port
+        :param timeout: seconds to wait for the hardware information
+        :param retries: number of times the hardware information is requested
+        :param settle_time: seconds to wait after the handshake, for firmwares
+            needing it
+        :param info: the MGMSG_HW_GET_INFO of the controller, if already known
+            (e.g. cached). The handshake is then skipped, and the information is
+            checked in the background (see :attr:`Port.verification`)
+        :raises TimeoutError: if the controller doesn't answer"""
         with Port.static_port_list_lock:
             try:
                 return Port.static_port_list[port]
             except KeyError:
-                #Do we have a BSC103 or BBD10x? These are card slot controllers
-                if sn[:2] in ('70', '73', '94'):
-                    p = CardSlotPort(port, sn)
-                else:
-                    p = SingleControllerPort(port, sn)
+                creation_lock = Port.static_port_creation_locks.setdefault(port, threading.Lock())
+        
+        with creation_lock:
+            with Port.static_port_list_lock:
+                #Created by another thread in the meantime?
+                p = Port.static_port_list.get(port, None)
+                if p is not None:
+                    return p
             
+            #Do we have a BSC103 or BBD10x? These are card slot controllers
+            if sn[:2] in ('70', '73', '94'):
+                p = CardSlotPort(port, sn, trusted, reactor, timeout, retries, settle_time, info)
+            else:
+                p = SingleControllerPort(port, sn, trusted, reactor, timeout, retries, settle_time, info)
+            
+            with Port.static_port_list_lock:
                 Port.static_port_list[port] = p
             
-                return p
+            return p
 
 class CardSlotPort(Port):
-    def __init__(self, port, sn = None):
+    def __init__(self, port, sn = None, trusted = False, reactor = None, timeout = 1, retries = 3, settle_time = 0, info = None):
         raise NotImplementedError("Card slot ports are not supported yet")
 
-class SingleControllerPort(Port):
-    def __init__(self, port, sn = None):
-        super().__init__(port, sn)
+class SingleControllerPort(SingleControllerMixin, Port):
+    def __init__(self, port, sn = None, trusted = False, reactor = None, timeout = 1, retries = 3, settle_time = 0, info = None):
+        super().__init__(port, sn, trusted, reactor, timeout, retries, settle_time, info)
         
         if self.channel_count != 1:
             raise NotImplementedError("Multiple channel devices are not supported yet")
 
     
-    def send_message(self, msg):
-        msg['source'] = 0x01
-        msg['dest'] = 0x50
-        super().send_message(msg)
-        
     def _recv_message(self, blocking = False):
         msg = super()._recv_message(blocking)
         if msg is None:
@@ -200,32 +448,6 @@ class SingleControllerPort(Port):
         assert msg['dest'] == 0x01
         return msg
 
-    def _handle_message(self, msg):
-        #Is it a channel message? In that case the stage object has to handle it
-        if 'chan_ident' in msg:
-            try:
-                return self._stages[msg['chan_ident']]._handle_message(msg)
-            except KeyError:
-                #Keep messages to stages that don't exist
-                return False
-        
-        #This is a system message, handle it ourselves
-        
-        #Not handled
-        return False
-    
     def get_stages(self, only_chan_idents = None):
-        from thorpy.stages import stage_name_from_get_hw_info, GenericStage
-        if only_chan_idents is None:
-            only_chan_idents = [0x01]
-            
-        assert len(only_chan_idents) <= 1 
-        assert all(x == 1 for x in only_chan_idents)
-            
-        ret = dict([(k, self._stages.get(k, None)) for k in only_chan_idents])
-        for k in only_chan_idents:
-            if ret[k] is None:
-                ret[k] = GenericStage(self, 0x01, stage_name_from_get_hw_info(self._info_message))
-                self._stages[k] = ret[k]
-                
-        return ret
+        assert only_chan_idents is None or len(only_chan_idents) <= 1
+        return self._generic_stages(only_chan_idents)
@@ -0,0 +1,116 @@
+import selectors
+import threading
+import traceback
+import weakref
+import socket
+import collections
+
+class Reactor:
+    """Services many ports from a single thread.
+
+    By default, each :class:`~thorpy.comm.port.Port` runs its own worker thread.
+    Ports created with a reactor instead register their serial port with it, and
+    the reactor thread waits on all of them at once (epoll/kqueue/select,
+    through :mod:`selectors`), handling the messages of every port which has
+    data available::
+
+        reactor = Reactor.shared()
+        p = Port.create('/dev/ttyUSB0', '83000001', reactor = reactor)
+
+    The reactor only keeps weak references to the ports."""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        #Registrations are done by the reactor thread, in order
+        self._pending = collections.deque()
+        #Used to wake up the reactor thread when there are pending registrations
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        #The reactor may be created by a short-lived thread: run until the main thread ends
+        self._thread_main = threading.main_thread()
+        self._thread = None
+
+    @classmethod
+    def shared(cls):
+        """Return the reactor shared by the whole process (created on first use)."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def register(self, port):
+        """Start servicing port. Returns the file descriptor registered, which
+        must be passed to :meth:`unregister`."""
+        fd = port.fileno()
+        with self._lock:
+            self._pending.append((fd, weakref.ref(port)))
+            if self._thread is None:
+                self._thread = threading.Thread(target = self.run, name = 'thorpy reactor')
+                self._thread.start()
+        self._wakeup()
+        return fd
+
+    def unregister(self, fd):
+        """Stop servicing the port with file descriptor fd."""
+        with self._lock:
+            self._pending.append((fd, None))
+        self._wakeup()
+
+    def __len__(self):
+        """Number of ports registered."""
+        return len(self._selector.get_map()) - 1
+
+    def _wakeup(self):
+        try:
+            self._wakeup_w.send(b'\x00')
+        except BlockingIOError:
+            pass  #Already woken up
+
+    def _process_pending(self):
+        try:
+            while self._wakeup_r.recv(1024):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self._lock:
+            while self._pending:
+                fd, port_ref = self._pending.popleft()
+                if port_ref is None:
+                    try:
+                        self._selector.unregister(fd)
+                    except (KeyError, ValueError):
+                        pass  #Not registered
+                else:
+                    self._selector.register(fd, selectors.EVENT_READ, port_ref)
+
+    def run(self):
+        timeout = 1
+        while self._thread_main.is_alive():
+            for key, events in self._selector.select(timeout):
+                if key.data is None:
+                    self._process_pending()
+                    continue
+
+                port = key.data()
+                if port is None:
+                    #Port deleted, but not unregistered yet
+                    self._selector.unregister(key.fd)
+                    continue
+
+                try:
+                    port._service()
+                except OSError:
+                    #The device is gone, stop polling it
+                    traceback.print_exc()
+                    port._set_lost()
+                    self._selector.unregister(key.fd)
+                except Exception:
+                    traceback.print_exc()
+                del port
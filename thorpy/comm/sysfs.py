@@ -0,0 +1,53 @@
+"""USB information of serial ports, read from sysfs (Linux only).
+
+Only sysfs files are read: no I/O is done with the devices themselves."""
+import os
+
+_attributes = ('idVendor', 'idProduct', 'serial', 'manufacturer', 'product')
+
+def available(root = '/sys'):
+    """Return True if the serial ports can be enumerated through sysfs."""
+    return os.path.isdir(os.path.join(root, 'class', 'tty'))
+
+def _device_attributes(path, root):
+    #The USB device is a parent of the interface of the tty
+    root = os.path.realpath(root)
+    while path.startswith(root + os.sep):
+        if os.path.exists(os.path.join(path, 'idVendor')):
+            ret = {}
+            for a in _attributes:
+                try:
+                    with open(os.path.join(path, a)) as f:
+                        ret[a] = f.read().strip()
+                except OSError:
+                    ret[a] = None
+            return ret
+        path = os.path.dirname(path)
+    return None
+
+def usb_attributes(port, root = '/sys'):
+    """Return a dict with the USB attributes (idVendor, idProduct, serial,
+    manufacturer, product) of the device behind serial port (e.g.
+    /dev/ttyUSB0), or None if it is not an USB device or sysfs is not
+    available."""
+    try:
+        name = os.path.basename(os.path.realpath(port))
+        path = os.path.realpath(os.path.join(root, 'class', 'tty', name, 'device'))
+    except OSError:
+        return None
+    return _device_attributes(path, root)
+
+def list_ports(root = '/sys'):
+    """Return a list of (serial port, USB attributes) of all USB serial ports,
+    see :func:`usb_attributes`."""
+    tty_dir = os.path.join(root, 'class', 'tty')
+    ret = []
+    for name in sorted(os.listdir(tty_dir)):
+        device = os.path.join(tty_dir, name, 'device')
+        #Virtual terminals, pseudo-terminals... have no device
+        if not os.path.exists(device):
+            continue
+        attributes = _device_attributes(os.path.realpath(device), root)
+        if attributes is not None:
+            ret.append(('/dev/' + name, attributes))
+    return ret
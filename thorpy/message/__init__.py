@@ -1,4 +1,5 @@
 from ._base import Message, IncompleteMessageException
+from ._parser import FrameParser
 
 from .systemcontrol import *
 from .motorcontrol import *
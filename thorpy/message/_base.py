@@ -6,7 +6,36 @@ class IncompleteMessageException(Exception):
     because some of the bytes are missing."""
     pass
 
-class Message:
+def _field_type_check(value_type):
+    """Return a function checking if a value is suitable for a struct field
+    of type value_type."""
+    if value_type == 'c':
+        return lambda v: type(v) == bytes and len(v) == 1
+    elif value_type == '?':
+        return lambda v: type(v) == bool
+    elif value_type in ('b', 'B', 'h', 'H', 'i', 'I', 'l', 'L', 'q', 'Q'):
+        value_size = 8 * {'B': 1, 'H': 2, 'I': 4, 'L': 4, 'Q': 8}[value_type.upper()]
+        if value_type == value_type.upper():
+            value_min, value_max = 0, 2 ** value_size
+        else:
+            value_min, value_max = -(2 ** (value_size - 1)), 2 ** (value_size - 1)
+        return lambda v: type(v) == int and value_min <= v < value_max
+    elif value_type in ('f', 'd'):
+        return lambda v: type(v) == float
+    elif value_type.endswith('s'):
+        value_length = int(value_type[:-1])
+        return lambda v: type(v) == bytes and len(v) <= value_length
+    else:
+        return lambda v: False
+
+class _MessageType(type):
+    """Metaclass of messages: gives every message class empty __slots__, so
+    that instances only store their _params tuple."""
+    def __new__(mcs, name, bases, namespace, **kw):
+        namespace.setdefault('__slots__', ())
+        return super().__new__(mcs, name, bases, namespace, **kw)
+
+class Message(metaclass = _MessageType):
     """Base class for messages.
     
     Subclasses should override:
@@ -14,6 +43,10 @@ class Message:
     - _message_struct_fields (list)
     - _params_names (list)
     - _message_struct (struct)
+    
+    Parameters are stored in a tuple, as they are sent on the wire (i.e.
+    after the _f_*_to_bytes conversions). Fields which have not been
+    assigned yet are None.
     """
     
     #This will be overrided by subclasses
@@ -27,16 +60,41 @@ class Message:
     #Final class attributes (Message parsing)
     #Unpack message_id and dest
     _message_base_unpack_struct = struct.Struct('<HxxBx')
-    #List of all final subclasses of Message (cache)
-    _all_final_subclasses = None
+    #Registry of all message classes, keyed by (message_id, long_message)
+    _registry = {}
+    #All message classes, keyed by class name
+    _by_name = {}
     
-    #Object attributes: parameters
-    _params = None
+    #Names of the classes of the replies to this message, see reply_classes
+    _reply_names = None
     
+    #Per class codec, see _compile_codec
+    _fields = None
+    _empty_params = None
     
+    #Object attributes: parameters
+    __slots__ = ('_params', )
+    
+
+    def __init_subclass__(cls, **kw):
+        super().__init_subclass__(**kw)
+        if cls.message_id is None and cls._params_names is None:
+            #Abstract class (e.g. MessageWithData)
+            return
+        
+        cls._validate_class_invariants()
+        cls._compile_codec()
+        
+        if cls.message_id is None:
+            return
+        
+        #Some message IDs are (wrongly) shared by two definitions, the first one wins
+        key = (cls.message_id, cls._message_struct.size > 6)
+        Message._registry.setdefault(key, cls)
+        Message._by_name.setdefault(cls.__name__, cls)
 
     def __init__(self, **kw):
-        self._params = {}
+        self._params = self._empty_params
         
         for k, v in kw.items():
             self[k] = v
@@ -45,65 +103,84 @@ class Message:
         if 'data_packet_length' in self:
             self['data_packet_length'] = len(self) - 6
         
-    def _validate_class_invariants(self):
-        assert self._params_names is not None, "Invalid class {0} (no _params_names)".format(self.__class__)
-        assert len(self._params_names) == len(self._message_struct_fields), "Invalid class {0} (length of _params_names and length of _message_struct_fields mismatch)".format(self.__class__)
-        assert self._message_struct.format.decode('ascii') == '<' + ''.join(self._message_struct_fields), "Invalid class {0} (structure _message_struct doesn't match _message_struct_fields)\nHint: add _message_struct = struct.Struct('<' + ''.join(_message_struct_fields)) at the end of the message definition".format(self.__class__)
-        return True
+    @classmethod
+    def _compile_codec(cls):
+        """Build the field table of the class, so that encoding, decoding or
+        accessing a field doesn't need to look up anything by name."""
+        #Field name -> (index, type check, type, padded length, validation hook, to bytes hook, from bytes hook)
+        cls._fields = {}
+        for i, (f, value_type) in enumerate(zip(cls._params_names, cls._message_struct_fields)):
+            if f is None:
+                continue
+            pad_length = int(value_type[:-1]) if value_type.endswith('s') else None
+            cls._fields[f] = (i, _field_type_check(value_type), value_type, pad_length,
+                              getattr(cls, '_f_{0}_validate'.format(f), None),
+                              getattr(cls, '_f_{0}_to_bytes'.format(f), None),
+                              getattr(cls, '_f_{0}_from_bytes'.format(f), None))
+        
+        #Unknown fields are sent as zeros
+        cls._empty_params = tuple(0 if f is None else None for f in cls._params_names)
+        
+    @classmethod
+    def _validate_class_invariants(cls):
+        """Check the definition of the class, raise TypeError if it is invalid.
+        This is done once, when the class is created."""
+        if cls._params_names is None:
+            raise TypeError("Invalid class {0} (no _params_names)".format(cls))
+        if cls._message_struct_fields is None or cls._message_struct is None:
+            raise TypeError("Invalid class {0} (no _message_struct_fields or _message_struct)".format(cls))
+        if len(cls._params_names) != len(cls._message_struct_fields):
+            raise TypeError("Invalid class {0} (length of _params_names and length of _message_struct_fields mismatch)".format(cls))
+        message_struct_format = cls._message_struct.format
+        if isinstance(message_struct_format, bytes):
+            #Python < 3.7
+            message_struct_format = message_struct_format.decode('ascii')
+        if message_struct_format != '<' + ''.join(cls._message_struct_fields):
+            raise TypeError("Invalid class {0} (structure _message_struct doesn't match _message_struct_fields)\nHint: add _message_struct = struct.Struct('<' + ''.join(_message_struct_fields)) at the end of the message definition".format(cls))
         
-            
     def __len__(self):
-        assert self._validate_class_invariants()
         return self._message_struct.size
     
     def __getitem__(self, k):
-        assert self._validate_class_invariants()
-        return self._params[k]
+        i, _, _, _, _, _, from_bytes = self._fields[k]
+        v = self._params[i]
+        if v is None:
+            raise KeyError(k)
+        if from_bytes is not None:
+            return from_bytes(self, v)
+        return v
     
     def __setitem__(self, k, v):
-        assert self._validate_class_invariants()
-        if k not in self._params_names:
+        i, v = self._validate_field(k, v)
+        params = list(self._params)
+        params[i] = v
+        self._params = tuple(params)
+        
+    def _validate_field(self, k, v):
+        """Check value v for field k, return the index of the field and the
+        value as it is sent on the wire."""
+        try:
+            i, type_check, value_type, pad_length, validate, to_bytes, _ = self._fields[k]
+        except KeyError:
             raise KeyError("Unknown key {0}".format(k))
         
-        ki = self._params_names.index(k)
-        
-        value_type = self._message_struct_fields[ki]
-        if value_type == 'c':
-            value_valid = type(v) == bytes and len(v) == 1
-        elif value_type == '?':
-            value_valid = type(v) == bool
-        elif value_type in ('b', 'B', 'h', 'H', 'i', 'I', 'l', 'L', 'q', 'Q'):
-            value_unsigned = value_type == value_type.upper()
-            value_size = 8 * {'B': 1, 'H': 2, 'I': 4, 'Q': 8}[value_type.upper()]
-            if type(v) == int:
-                if value_unsigned:
-                    value_valid = v >= 0 and v < (2 ** value_size)
-                else:
-                    value_valid = v >= -(2 ** (value_size - 1)) and v < (2 ** (value_size - 1))
-            else:
-                value_valid = False
-        elif value_type in ('f', 'd'):
-            value_valid = type(v) == float
-        elif value_type.endswith('s'):
-            value_valid = type(v) == bytes and len(v) <= int(value_type[:-1])
-        else:
-            value_valid = False
-            
-        if not value_valid:
+        if not type_check(v):
             raise ValueError("Value {1!r} is not suitable for field {0} (type {2})".format(k, v, value_type))
         
         #Pad bytes
-        if value_type.endswith('s'):
-            value_length = int(value_type[:-1])
-            v += (value_length - len(v)) * b'\x00'
+        if pad_length is not None:
+            v += (pad_length - len(v)) * b'\x00'
             
-        if hasattr(self, '_f_{0}_validate'.format(k)):
-            if not getattr(self, '_f_{0}_validate'.format(k))(v):
+        if validate is not None:
+            if not validate(self, v):
                 raise ValueError("Failed to validate field {0} with value {1!r}".format(k, v))
-        self._params[k] = v
+        
+        if to_bytes is not None:
+            v = to_bytes(self, v)
+        return i, v
         
     def __contains__(self, k):
-        return k in self._params_names
+        return k in self._fields
     
     def keys(self):
         return self._params_names
@@ -131,11 +208,24 @@ class Message:
         return v in (0x01, 0x02)
 
     @classmethod
-    def parse(cls, message):
+    def parse(cls, message, validate = True, offset = 0):
+        """Parse a message from its bytes.
+        
+        :param message: bytes of the message (may be followed by other data)
+        :param validate: if False, fields are not validated. Use it only for
+            trusted data, i.e. frames sent by the hardware.
+        :param offset: position of the message in message
+        :raises IncompleteMessageException: if message is too short"""
         #If the class is NOT a generic class, create an object and assign the bits
         if cls.message_id is not None:
-            obj = cls()
-            obj.bytes = message
+            obj = cls.__new__(cls)
+            try:
+                params = cls._message_struct.unpack_from(message, offset)
+            except struct.error:
+                raise IncompleteMessageException()
+            if validate:
+                obj._validate_params(params)
+            obj._params = params
             return obj
         
         #If instead we have a generic class, than we need to extract the message ID
@@ -143,72 +233,73 @@ class Message:
         #(some messages have two variants)
         
         #Messages less than 6 bytes cannot be complete according to the spec, ignore them
-        if len(message) < cls._message_base_unpack_struct.size:
+        if len(message) - offset < cls._message_base_unpack_struct.size:
             raise IncompleteMessageException()
         
         #Get message id and destination
-        message_id, dest = cls._message_base_unpack_struct.unpack(message[:cls._message_base_unpack_struct.size])
+        message_id, dest = cls._message_base_unpack_struct.unpack_from(message, offset)
         
         #Is this a long message?
         long_message = (dest & 0x80) == 0x80
 
-        #We cache for performance reasons the list of all Message subclasses
-        if cls._all_final_subclasses is None:
-            #Generic parse, we need to find the class
-            subclasses = [Message]
-            while any([len(x.__subclasses__()) > 0 for x in subclasses]):
-                subclasses = [x for x in subclasses if len(x.__subclasses__()) == 0] + sum([x.__subclasses__() for x in subclasses if len(x.__subclasses__()) > 0], [])
-                
-            #Useful to debug problems fast
-            for c in subclasses:
-                assert c()._validate_class_invariants()
-                
-            Message._all_final_subclasses = subclasses
-
         #Find the correct class for the message
-        for c in Message._all_final_subclasses:
-            if c.message_id == message_id and long_message == (c._message_struct.size > 6):
-                return c.parse(message)
-            
-        #Unable to find the message
-        raise ValueError("Unknown message ID 0x{0:04X} {1!r}".format(message_id, message))
+        return cls.get_class(message_id, long_message).parse(message, validate, offset)
     
-    def __len__(self):
-        return self._message_struct.size    
+    @staticmethod
+    def get_class(message_id, long_message):
+        """Return the message class for a given message ID.
+        
+        :param message_id: the message ID
+        :type message_id: int
+        :param long_message: True if the message has a data packet (header followed by data)
+        :type long_message: bool
+        :raises ValueError: if the message ID is unknown"""
+        try:
+            return Message._registry[(message_id, long_message)]
+        except KeyError:
+            raise ValueError("Unknown message ID 0x{0:04X} ({1} message)".format(message_id, 'long' if long_message else 'short'))
+    
+    @staticmethod
+    def all_classes():
+        """Return a list of all message classes that can be parsed."""
+        return list(Message._registry.values())
+    
+    @classmethod
+    def reply_classes(cls):
+        """Return the classes of the messages sent by the controller in reply to
+        this one, e.g. (MGMSG_MOT_GET_VELPARAMS, ) for MGMSG_MOT_REQ_VELPARAMS.
+        Empty if no reply is expected."""
+        names = cls._reply_names
+        if names is None:
+            names = [cls.__name__.replace('_REQ_', '_GET_', 1)] if '_REQ_' in cls.__name__ else []
+        return tuple(Message._by_name[n] for n in names if n in Message._by_name)
     
     @property
     def bytes(self):
-        assert self._validate_class_invariants()
-        p = []
-        for f in self._params_names:
-            if f is None:
-                p.append(0)
-            else:
-                if hasattr(self, '_f_{0}_to_bytes'.format(f)):
-                    p.append(getattr(self, '_f_{0}_to_bytes'.format(f))(self[f]))
-                else:
-                    p.append(self[f])
-
-        return self._message_struct.pack(*p)
+        try:
+            return self._message_struct.pack(*self._params)
+        except struct.error:
+            #Some fields have not been assigned
+            for f in self._fields:
+                self[f]
+            raise
     
     @bytes.setter
     def bytes(self, message):
-        assert self._validate_class_invariants()
         try:
-            params = self._message_struct.unpack(message[:self._message_struct.size])
+            params = self._message_struct.unpack_from(message)
         except struct.error:
             raise IncompleteMessageException()
         
-        for f, p in zip(self._params_names, params):
-            if f is None:
-                continue
-            if hasattr(self, '_f_{0}_from_bytes'.format(f)):
-                self[f] = getattr(self, '_f_{0}_from_bytes'.format(f))(p)
-            else:
-                self[f] = p
-                
+        self._validate_params(params)
+        self._params = params
+    
+    def _validate_params(self, params):
+        """Validate all fields of params, a tuple of values as sent on the wire."""
+        for f, (i, _, _, _, _, _, from_bytes) in self._fields.items():
+            self._validate_field(f, params[i] if from_bytes is None else from_bytes(self, params[i]))
+        
     def __repr__(self):
-        assert self._validate_class_invariants()
         params = []
         for f in self._params_names:
             #Ignore unknown field or message_id (which is already specified by the class name)
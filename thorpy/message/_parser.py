@@ -0,0 +1,125 @@
+from ._base import Message
+import struct
+
+class FrameParser:
+    """Streaming parser, which extracts messages from a byte stream (e.g. data
+    read from a serial port, or a capture file).
+    
+    Data is appended to an internal buffer, and messages are parsed in place,
+    without copying the buffer for each message::
+    
+        parser = FrameParser()
+        for msg in parser.feed(data):
+            print(msg)
+    
+    Incomplete messages stay in the buffer until more data is fed.
+    Messages with an unknown ID, or with invalid fields, are skipped: the
+    iterator reports them to on_error and goes on with the next ones, while
+    :meth:`next_message` raises ValueError (the parser can be used again
+    afterwards). After an unknown ID, the data is skipped up to the next
+    known message header, so that lost bytes don't desynchronize the stream.
+    
+    :param validate: if False, fields of the messages are not validated (see
+        :meth:`Message.parse`)
+    :type validate: bool
+    :param on_error: called with the ValueError of each message skipped while
+        iterating, by default the error is printed"""
+    
+    #Unpack message_id, data_packet_length and dest
+    _header_struct = struct.Struct('<HHB')
+    _header_size = 6
+    
+    #Consumed bytes are removed from the buffer once there are more than this
+    compact_threshold = 4096
+    
+    def __init__(self, validate = True, on_error = None):
+        self.validate = validate
+        self.on_error = on_error
+        self._buffer = bytearray()
+        self._offset = 0
+        
+    def feed(self, data):
+        """Append data to the buffer, and return an iterator over the complete
+        messages available."""
+        self._buffer += data
+        return self
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        while True:
+            try:
+                msg = self.next_message()
+            except ValueError as e:
+                if self.on_error is None:
+                    print("Skipped invalid message: {0}".format(e))
+                else:
+                    self.on_error(e)
+                continue
+            if msg is None:
+                raise StopIteration
+            return msg
+    
+    def next_message(self):
+        """Return the next complete message, or None if more data is needed.
+        
+        :raises ValueError: if the next message has an unknown ID or invalid
+            fields (it is skipped)"""
+        buffer = self._buffer
+        offset = self._offset
+        available = len(buffer) - offset
+        
+        if available < self._header_size:
+            return None
+        
+        message_id, data_packet_length, dest = self._header_struct.unpack_from(buffer, offset)
+        long_message = (dest & 0x80) == 0x80
+        
+        try:
+            cls = Message.get_class(message_id, long_message)
+        except ValueError:
+            #Unknown message, or lost sync (e.g. a partial frame): skip to the
+            #next plausible header, instead of trusting data_packet_length
+            skip = 1
+            while skip + self._header_size <= available and not self._is_header(buffer, offset + skip):
+                skip += 1
+            self._consume(skip)
+            raise
+        
+        length = cls._message_struct.size
+        if available < length:
+            return None
+        
+        try:
+            msg = cls.parse(buffer, self.validate, offset)
+        finally:
+            #Also skip frames with invalid fields, so that the stream stays in sync
+            self._consume(length)
+        return msg
+    
+    def _is_header(self, buffer, offset):
+        """True if a known message, with the right length, starts at offset."""
+        message_id, data_packet_length, dest = self._header_struct.unpack_from(buffer, offset)
+        long_message = (dest & 0x80) == 0x80
+        cls = Message._registry.get((message_id, long_message), None)
+        if cls is None:
+            return False
+        return not long_message or data_packet_length == cls._message_struct.size - self._header_size
+    
+    def _consume(self, length):
+        self._offset += length
+        if self._offset == len(self._buffer):
+            self.clear()
+        elif self._offset > self.compact_threshold:
+            del self._buffer[:self._offset]
+            self._offset = 0
+            
+    def clear(self):
+        """Drop all buffered data."""
+        del self._buffer[:]
+        self._offset = 0
+        
+    def __len__(self):
+        """Number of bytes buffered, not parsed yet."""
+        return len(self._buffer) - self._offset
@@ -1384,6 +1384,8 @@ class MGMSG_MOT_REQ_STATUSUPDATE(MessageWithoutData):
     :type chan_ident: int"""
     message_id = 0x0480
     _params_names = ['message_id'] + ['chan_ident', None] + ['dest', 'source']
+    #DC servo controllers answer with MGMSG_MOT_GET_DCSTATUSUPDATE
+    _reply_names = ['MGMSG_MOT_GET_STATUSUPDATE', 'MGMSG_MOT_GET_DCSTATUSUPDATE']
 
 class MGMSG_MOT_GET_STATUSUPDATE(MessageWithData):
     """This message is returned when a status update is requested for the
@@ -0,0 +1,4 @@
+"""Simulated APT controllers on pseudo-terminals, to use thorpy without
+hardware (tests, benchmarks)."""
+from .controller import VirtualController
+from .host import SimulatorHost
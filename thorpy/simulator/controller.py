@@ -0,0 +1,299 @@
+from thorpy.message import *
+import collections
+import math
+import random
+
+from thorpy.stages.profiles import _T
+
+class _Channel:
+    """Motion state of a channel, in encoder counts (positions), counts/s
+    (velocities) and counts/s² (accelerations)."""
+
+    def __init__(self, chan_ident, max_velocity, acceleration, home_velocity, jog_step_size):
+        self.chan_ident = chan_ident
+        self.enabled = False
+        self.homed = False
+        self.position = 0.0
+        self.velocity = 0.0
+        self.min_velocity = 0.0
+        self.max_velocity = max_velocity
+        self.acceleration = acceleration
+        self.home_velocity = home_velocity
+        self.home_direction = 2
+        self.home_limit_switch = 1
+        self.home_offset_distance = 0
+        self.jog_step_size = jog_step_size
+
+        #Current move: None, 'move', 'jog', 'home', 'velocity' or 'stop'
+        self.mode = None
+        self.target = None
+        self.direction = 0
+        #Message class sent when the current move ends
+        self.completion = None
+
+    @property
+    def status_bits(self):
+        bits = 0
+        if self.mode is not None:
+            if self.mode == 'home':
+                bits |= 0x00000200
+            elif self.mode == 'jog':
+                bits |= 0x00000040 if self.direction > 0 else 0x00000080
+            if self.velocity > 0:
+                bits |= 0x00000010
+            elif self.velocity < 0:
+                bits |= 0x00000020
+        if self.homed:
+            bits |= 0x00000400
+        if self.enabled:
+            bits |= 0x80000000
+        return bits
+
+    def start(self, mode, target = None, direction = 0, completion = MGMSG_MOT_MOVE_COMPLETED):
+        self.mode = mode
+        self.target = target
+        if target is not None:
+            direction = 1 if target >= self.position else -1
+        self.direction = direction
+        self.completion = completion
+
+    def step(self, dt):
+        """Advance the trapezoidal profile by dt seconds. Returns the completion
+        message class if the move ended."""
+        if self.mode is None:
+            return None
+
+        max_velocity = self.home_velocity if self.mode == 'home' else self.max_velocity
+        a = self.acceleration
+        if self.target is not None:
+            remaining = self.target - self.position
+            #Fastest speed from which the target can still be reached
+            wanted = math.copysign(min(max_velocity, math.sqrt(2 * a * abs(remaining))), remaining)
+        elif self.mode == 'stop':
+            wanted = 0.0
+        else:
+            wanted = self.direction * max_velocity
+
+        dv = wanted - self.velocity
+        self.velocity += max(-a * dt, min(a * dt, dv))
+        self.position += self.velocity * dt
+
+        if self.target is not None and (self.target - self.position) * self.direction <= 0.5:
+            self.position = float(self.target)
+            return self._end()
+        if self.mode == 'stop' and self.velocity == 0.0:
+            return self._end()
+        return None
+
+    def stop(self, immediate):
+        if self.mode is None:
+            return MGMSG_MOT_MOVE_STOPPED
+        if immediate:
+            self.velocity = 0.0
+            return self._end(MGMSG_MOT_MOVE_STOPPED)
+        self.start('stop', completion = MGMSG_MOT_MOVE_STOPPED)
+        return None
+
+    def _end(self, completion = None):
+        if completion is None:
+            completion = self.completion
+        if self.mode == 'home':
+            self.position = 0.0
+            self.homed = True
+        self.mode = None
+        self.target = None
+        self.velocity = 0.0
+        return completion
+
+
+class VirtualController:
+    """Simulated single channel motor controller, behaving like a TDC001 with
+    a MTS50-Z8 stage by default.
+
+    The controller is driven by a :class:`~thorpy.simulator.SimulatorHost`,
+    which connects it to a pseudo-terminal: a :class:`~thorpy.comm.port.Port`
+    opened on :attr:`path` talks to it like to real hardware.
+
+    It answers hardware information, status, velocity and homing parameter
+    requests, and models trapezoidal motion for absolute/relative moves,
+    jogs, velocity moves, stops and homing. Status updates are sent at
+    update_rate once the updates are started and the channel is enabled.
+
+    :param serial_number: serial number, the first two digits are the controller type
+    :param model_number: model number, as sent in MGMSG_HW_GET_INFO
+    :param stage_type: stage type sent in MGMSG_HW_GET_INFO (see
+        :func:`thorpy.stages.stage_name_from_get_hw_info`)
+    :param hw_version: hardware version sent in MGMSG_HW_GET_INFO
+    :param info: other MGMSG_HW_GET_INFO fields, overriding the defaults
+    :param dc_servo: send MGMSG_MOT_GET_DCSTATUSUPDATE instead of MGMSG_MOT_GET_STATUSUPDATE
+    :param update_rate: status updates per second
+    :param max_velocity: in encoder counts/s
+    :param acceleration: in encoder counts/s²
+    :param home_velocity: in encoder counts/s
+    :param jog_step_size: in encoder counts
+    :param latency: delay before each message is sent back, in seconds
+    :param jitter: maximum random delay added to latency, in seconds"""
+
+    def __init__(self, serial_number = 83000001, model_number = b'TDC001', stage_type = 0x08, hw_version = 1, info = None,
+                 dc_servo = True, update_rate = 10, max_velocity = 78899, acceleration = 51456, home_velocity = 34304,
+                 jog_step_size = 3430, latency = 0, jitter = 0):
+        self.serial_number = serial_number
+        self.dc_servo = dc_servo
+        self.update_rate = update_rate
+        self.latency = latency
+        self.jitter = jitter
+
+        info_fields = dict(serial_number = serial_number, model_number = model_number, type = 16,
+                           firmware_version = b'\x00\x00\x00\x00', notes = b'',
+                           empty_space = b'\x00' * 10 + bytes([stage_type, 0]),
+                           hw_version = hw_version, mod_state = 0, nchs = 1)
+        if info is not None:
+            info_fields.update(info)
+        self._info = MGMSG_HW_GET_INFO(dest = 0x01, source = 0x50, **info_fields)
+
+        self._channels = {1: _Channel(1, max_velocity, acceleration, home_velocity, jog_step_size)}
+        self._updates = False
+        self._next_update = None
+        self._last_step = None
+
+        #(time, data) to send, in order
+        self._output = collections.deque()
+        self._last_output_time = 0
+
+        #Set by the host
+        self.path = None
+
+        #Statistics
+        self.messages_received = 0
+        self.messages_sent = 0
+
+    def __repr__(self):
+        return '<{0} {1} on {2}>'.format(self.__class__.__name__, self.serial_number, self.path)
+
+    def channel(self, chan_ident = 1):
+        """Return the motion state of a channel (position, velocity, homed,
+        ... in encoder counts). Only consistent when the host is stopped."""
+        return self._channels[chan_ident]
+
+    def send(self, msg, now):
+        """Queue msg, to be sent after the link latency."""
+        msg['dest'] = 0x01
+        msg['source'] = 0x50
+        t = now + self.latency
+        if self.jitter:
+            t += random.uniform(0, self.jitter)
+        #A serial link doesn't reorder messages
+        t = max(t, self._last_output_time)
+        self._last_output_time = t
+        self._output.append((t, msg.bytes))
+
+    def pop_output(self, now):
+        """Return the data due to be sent at time now."""
+        data = []
+        output = self._output
+        while output and output[0][0] <= now:
+            data.append(output.popleft()[1])
+        self.messages_sent += len(data)
+        return b''.join(data)
+
+    def next_event_time(self):
+        """Time at which update() or pop_output() has something to do, or None."""
+        times = []
+        if self._output:
+            times.append(self._output[0][0])
+        if self._next_update is not None:
+            times.append(self._next_update)
+        if any(c.mode is not None for c in self._channels.values()):
+            times.append(self._last_step + 0.005)
+        return min(times) if times else None
+
+    def update(self, now):
+        """Advance the motion of all channels, and send the periodic status updates."""
+        if self._last_step is None:
+            self._last_step = now
+        dt = now - self._last_step
+        self._last_step = now
+        for c in self._channels.values():
+            completion = c.step(dt)
+            if completion is not None:
+                self._send_completion(c, completion, now)
+
+        if self._next_update is not None and now >= self._next_update:
+            for c in self._channels.values():
+                if c.enabled:
+                    self._send_status(c, now)
+            self._next_update = max(self._next_update + 1 / self.update_rate, now)
+
+    def _send_status(self, c, now):
+        if self.dc_servo:
+            self.send(MGMSG_MOT_GET_DCSTATUSUPDATE(chan_ident = c.chan_ident, position = int(c.position),
+                                                   velocity = int(abs(c.velocity) * _T), status_bits = c.status_bits), now)
+        else:
+            self.send(MGMSG_MOT_GET_STATUSUPDATE(chan_ident = c.chan_ident, position = int(c.position),
+                                                 enc_count = int(c.position), status_bits = c.status_bits), now)
+
+    def _send_completion(self, c, completion, now):
+        if completion is MGMSG_MOT_MOVE_HOMED:
+            self.send(MGMSG_MOT_MOVE_HOMED(chan_ident = c.chan_ident), now)
+        else:
+            self.send(completion(chan_ident = c.chan_ident, position = int(c.position), status_bits = c.status_bits), now)
+
+    def handle(self, msg, now):
+        """Handle a message received from the host computer."""
+        self.messages_received += 1
+        #Motion is up to date when a command is handled
+        self.update(now)
+
+        if isinstance(msg, MGMSG_HW_REQ_INFO):
+            self.send(self._info, now)
+        elif isinstance(msg, MGMSG_HW_START_UPDATEMSGS):
+            self._updates = True
+            self._next_update = now
+        elif isinstance(msg, MGMSG_HW_STOP_UPDATEMSGS):
+            self._updates = False
+            self._next_update = None
+        elif 'chan_ident' in msg and msg['chan_ident'] in self._channels:
+            self._handle_channel_message(self._channels[msg['chan_ident']], msg, now)
+
+    def _handle_channel_message(self, c, msg, now):
+        if isinstance(msg, MGMSG_MOD_SET_CHANENABLESTATE):
+            c.enabled = msg['chan_enable_state'] == 0x01
+        elif isinstance(msg, MGMSG_MOD_REQ_CHANENABLESTATE):
+            self.send(MGMSG_MOD_GET_CHANENABLESTATE(chan_ident = c.chan_ident, chan_enable_state = 0x01 if c.enabled else 0x02), now)
+        elif isinstance(msg, (MGMSG_MOT_REQ_STATUSUPDATE, MGMSG_MOT_REQ_DCSTATUSUPDATE)):
+            self._send_status(c, now)
+        elif isinstance(msg, MGMSG_MOT_REQ_VELPARAMS):
+            self.send(MGMSG_MOT_GET_VELPARAMS(chan_ident = c.chan_ident,
+                                              min_velocity = int(c.min_velocity * _T * 65536),
+                                              max_velocity = int(c.max_velocity * _T * 65536),
+                                              acceleration = int(c.acceleration * _T ** 2 * 65536)), now)
+        elif isinstance(msg, MGMSG_MOT_SET_VELPARAMS):
+            c.min_velocity = msg['min_velocity'] / (_T * 65536)
+            c.max_velocity = msg['max_velocity'] / (_T * 65536)
+            c.acceleration = msg['acceleration'] / (_T ** 2 * 65536)
+        elif isinstance(msg, MGMSG_MOT_REQ_HOMEPARAMS):
+            self.send(MGMSG_MOT_GET_HOMEPARAMS(chan_ident = c.chan_ident, home_direction = c.home_direction,
+                                               limit_switch = c.home_limit_switch,
+                                               home_velocity = int(c.home_velocity * _T * 65536),
+                                               offset_distance = c.home_offset_distance), now)
+        elif isinstance(msg, MGMSG_MOT_SET_HOMEPARAMS):
+            c.home_direction = msg['home_direction']
+            c.home_limit_switch = msg['limit_switch']
+            c.home_velocity = msg['home_velocity'] / (_T * 65536)
+            c.home_offset_distance = msg['offset_distance']
+        elif isinstance(msg, MGMSG_MOT_MOVE_ABSOLUTE_long):
+            c.start('move', msg['absolute_distance'])
+        elif isinstance(msg, MGMSG_MOT_MOVE_RELATIVE_long):
+            c.start('move', (c.target if c.target is not None else c.position) + msg['relative_distance'])
+        elif isinstance(msg, MGMSG_MOT_MOVE_HOME):
+            c.homed = False
+            c.start('home', 0.0, completion = MGMSG_MOT_MOVE_HOMED)
+        elif isinstance(msg, MGMSG_MOT_MOVE_JOG):
+            step = c.jog_step_size if msg['direction'] == 0x01 else -c.jog_step_size
+            c.start('jog', c.position + step)
+        elif isinstance(msg, MGMSG_MOT_MOVE_VELOCITY):
+            c.start('velocity', direction = 1 if msg['direction'] == 0x01 else -1, completion = MGMSG_MOT_MOVE_STOPPED)
+        elif isinstance(msg, MGMSG_MOT_MOVE_STOP):
+            completion = c.stop(msg['stop_mode'] == 0x01)
+            if completion is not None:
+                self._send_completion(c, completion, now)
@@ -0,0 +1,168 @@
+import os
+import selectors
+import threading
+import time
+import tty
+
+from thorpy.message import FrameParser
+
+class SimulatorHost:
+    """Runs many :class:`~thorpy.simulator.VirtualController` at once, each
+    on its own pseudo-terminal, from a single thread (POSIX only)::
+
+        with SimulatorHost([VirtualController(83000001), VirtualController(83000002)]) as host:
+            for c in host.controllers:
+                p = Port.create(c.path, str(c.serial_number))
+
+    :param controllers: controllers to add, see :meth:`add`
+    :param tick: maximum time between two motion updates, in seconds"""
+
+    #Bytes kept per controller when its pseudo-terminal is full
+    max_pending = 65536
+
+    def __init__(self, controllers = (), tick = 0.005):
+        self.tick = tick
+        self.controllers = []
+        self._masters = {}
+        #Controller -> output not written yet (the pseudo-terminal was full)
+        self._pending = {}
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._continue = False
+        #Used to wake up the host thread when a controller is added
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        for c in controllers:
+            self.add(c)
+
+    def add(self, controller):
+        """Open a pseudo-terminal for controller, and set controller.path to
+        the path of its slave side."""
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        controller.path = os.ttyname(slave)
+        with self._lock:
+            #The slave is kept open, so that reading the master doesn't fail when no port is open
+            self._selector.register(master, selectors.EVENT_READ, (controller, FrameParser(), slave))
+            self.controllers.append(controller)
+            self._masters[controller] = master
+        os.write(self._wakeup_w, b'\x00')
+        return controller
+
+    def remove(self, controller):
+        """Close the pseudo-terminal of controller, as if it was unplugged."""
+        with self._lock:
+            master = self._masters.pop(controller)
+            self.controllers.remove(controller)
+            self._pending.pop(controller, None)
+            key = self._selector.unregister(master)
+        os.close(key.data[2])
+        os.close(master)
+        controller.path = None
+
+    def start(self):
+        """Run the controllers in a background thread."""
+        self._continue = True
+        self._thread = threading.Thread(target = self._run, name = 'thorpy simulator', daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        self._continue = False
+        if self._thread is not None:
+            os.write(self._wakeup_w, b'\x00')
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Stop, and close all pseudo-terminals."""
+        self.stop()
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None:
+                os.close(key.data[2])
+                os.close(key.fd)
+        self._selector.close()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def run(self, should_stop = None):
+        """Run the controllers in the current thread, until :meth:`stop` is
+        called or should_stop() returns True (checked at every tick)."""
+        self._continue = True
+        self._run(should_stop)
+
+    def _run(self, should_stop = None):
+        while self._continue and (should_stop is None or not should_stop()):
+            now = time.monotonic()
+            timeout = self.tick
+            with self._lock:
+                controllers = list(self._masters.items())
+            for c, master in controllers:
+                t = c.next_event_time()
+                if t is not None:
+                    timeout = min(timeout, t - now)
+
+            for key, events in self._selector.select(max(0, timeout)):
+                if key.data is None:
+                    try:
+                        os.read(self._wakeup_r, 1024)
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                controller, parser, slave = key.data
+                try:
+                    data = os.read(key.fd, 4096)
+                except OSError:
+                    continue
+                now = time.monotonic()
+                parser.feed(data)
+                while True:
+                    try:
+                        msg = parser.next_message()
+                    except ValueError:
+                        continue  #Skipped by the parser
+                    if msg is None:
+                        break
+                    controller.handle(msg, now)
+
+            now = time.monotonic()
+            for c, master in controllers:
+                c.update(now)
+                data = c.pop_output(now)
+                with self._lock:
+                    #Removed meanwhile: master is closed, and its fd may have been reused
+                    if self._masters.get(c, None) != master:
+                        continue
+                    self._write(c, master, data)
+
+    def _write(self, controller, master, data):
+        #Called with the lock held. Partial writes are completed at the next ticks
+        pending = self._pending.get(controller, b'')
+        if len(pending) > self.max_pending:
+            #Nobody reading: drop whole frames, the stream stays in sync
+            data = b''
+        data = pending + data
+        if not data:
+            return
+        try:
+            written = os.write(master, data)
+        except BlockingIOError:
+            written = 0
+        except OSError:
+            #Nobody reading
+            written = len(data)
+        if written < len(data):
+            self._pending[controller] = data[written:]
+        else:
+            self._pending.pop(controller, None)
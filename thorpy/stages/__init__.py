@@ -1,7 +1,14 @@
 from thorpy.message import *
 import weakref
 import time
-import pkgutil
+import threading
+import concurrent.futures
+
+from .profiles import StageProfile, stage_profiles, get_stage_profile
+from .status import StatusFlags, StageSnapshot, decode_status_bits
+from .asyncstage import AsyncStage
+from .group import StageGroup, GroupMoveResult
+from .trajectory import TrajectoryExecutor, TrajectoryResult
 
 def _print_stage_detection_improve_message(m):
     import sys
@@ -91,75 +98,12 @@ def stage_name_from_get_hw_info(m):
 
 class GenericStage:
     def __init__(self, port, chan_ident, ini_section):
-        import os, configparser
         self._port = port
         self._chan_ident = chan_ident
-        self._config = configparser.ConfigParser()
-        self._config.read_string(pkgutil.get_data('thorpy.stages','MG17APTServer.ini').decode('ascii'))
-        
         self._name = ini_section
+        #Shared by all stages with the same name
+        self._profile = get_stage_profile(ini_section)
         
-        self._conf_stage_id = self._config.getint(ini_section, 'Stage ID')
-        self._conf_axis_id = self._config.getint(ini_section, 'Axis ID')
-        self._conf_units = self._config.getint(ini_section, 'Units')
-        self._conf_pitch = self._config.getfloat(ini_section, 'Pitch')
-        self._conf_dir_sense = self._config.getint(ini_section, 'Dir Sense')
-        self._conf_min_pos = self._config.getfloat(ini_section, 'Min Pos')
-        self._conf_max_pos = self._config.getfloat(ini_section, 'Max Pos')
-        self._conf_def_min_vel = self._config.getfloat(ini_section, 'Def Min Vel')
-        self._conf_def_accn = self._config.getfloat(ini_section, 'Def Accn')
-        self._conf_def_max_vel = self._config.getfloat(ini_section, 'Def Max Vel')
-        self._conf_max_accn = self._config.getfloat(ini_section, 'Max Accn')
-        self._conf_def_accn = self._config.getfloat(ini_section, 'Def Accn')
-        self._conf_max_vel = self._config.getfloat(ini_section, 'Max Vel')
-        self._conf_backlash_dist = self._config.getfloat(ini_section, 'Backlash Dist')
-        self._conf_move_factor = self._config.getint(ini_section, 'Move Factor')
-        self._conf_rest_factor = self._config.getint(ini_section, 'Rest Factor')
-        self._conf_cw_hard_limit = self._config.getint(ini_section, 'CW Hard Limit')
-        self._conf_ccw_hard_limit = self._config.getint(ini_section, 'CCW Hard Limit')
-        self._conf_cw_soft_limit = self._config.getfloat(ini_section, 'CW Soft Limit')
-        self._conf_ccw_soft_limit = self._config.getfloat(ini_section, 'CCW Soft Limit')        
-        self._conf_soft_limit_mode = self._config.getint(ini_section, 'Soft Limit Mode')
-        self._conf_home_dir = self._config.getint(ini_section, 'Home Dir')
-        self._conf_home_limit_switch = self._config.getint(ini_section, 'Home Limit Switch')
-        self._conf_home_vel = self._config.getfloat(ini_section, 'Home Vel')
-        self._conf_home_zero_offset = self._config.getfloat(ini_section, 'Home Zero Offset')
-        self._conf_jog_mode = self._config.getint(ini_section, 'Jog Mode')
-        self._conf_jog_step_size = self._config.getfloat(ini_section, 'Jog Step Size')
-        self._conf_jog_min_vel = self._config.getfloat(ini_section, 'Jog Min Vel')
-        self._conf_jog_accn = self._config.getfloat(ini_section, 'Jog Accn')
-        self._conf_jog_max_vel = self._config.getfloat(ini_section, 'Jog Max Vel')
-        self._conf_jog_stop_mode = self._config.getint(ini_section, 'Jog Stop Mode')
-        self._conf_steps_per_rev = self._config.getint(ini_section, 'Steps Per Rev')
-        self._conf_gearbox_ratio = self._config.getint(ini_section, 'Gearbox Ratio')
-        self._conf_dc_servo = self._config.getboolean(ini_section, 'DC Servo', fallback = False)
-        
-        if self._conf_dc_servo:
-            self._conf_dc_prop = self._config.getint(ini_section, 'DC Prop')
-            self._conf_dc_int = self._config.getint(ini_section, 'DC Int')
-            self._conf_dc_diff = self._config.getint(ini_section, 'DC Diff')
-            self._conf_dc_intlim = self._config.getint(ini_section, 'DC IntLim')
-        
-        self._conf_fp_controls = self._config.getboolean(ini_section, 'FP Controls', fallback = False)
-        if self._conf_fp_controls:
-            self._conf_pot_zero_wnd = self._config.getint(ini_section, 'Pot Zero Wnd')
-            self._conf_pot_vel_1 = self._config.getfloat(ini_section, 'Pot Vel 1')
-            self._conf_pot_wnd_1 = self._config.getint(ini_section, 'Pot Wnd 1')
-            self._conf_pot_vel_2 = self._config.getfloat(ini_section, 'Pot Vel 2')
-            self._conf_pot_wnd_2 = self._config.getint(ini_section, 'Pot Wnd 2')
-            self._conf_pot_vel_3 = self._config.getfloat(ini_section, 'Pot Vel 3')
-            self._conf_pot_wnd_3 = self._config.getint(ini_section, 'Pot Wnd 3')
-            self._conf_pot_vel_4 = self._config.getfloat(ini_section, 'Pot Vel 4')
-            self._conf_button_mode = self._config.getint(ini_section, 'Button Mode')
-            self._conf_button_pos_1 = self._config.getfloat(ini_section, 'Button Pos 1')
-            self._conf_button_pos_2 = self._config.getfloat(ini_section, 'Button Pos 2')
-            
-        self._conf_js_params = self._config.getboolean(ini_section, 'JS Params', fallback = False)
-        if self._conf_js_params:
-            self._conf_js_gearlow_maxvel = self._config.getfloat(ini_section, 'JS GearLow MaxVel')
-            self._conf_js_gearlow_accn = self._config.getfloat(ini_section, 'JS GearLow Accn')
-            self._conf_js_dir_sense = self._config.getfloat(ini_section, 'JS Dir Sense')
-            
         self._last_ack_sent = time.time()
         
         self._port.send_message(MGMSG_MOD_SET_CHANENABLESTATE(chan_ident = self._chan_ident, chan_enable_state = 0x01))
@@ -169,7 +113,11 @@ class GenericStage:
         #STATUSUPDATE
         self._state_position = None
         self._state_velocity = None
+        #Whether the status updates have a velocity (DC servo controllers)
+        self._state_velocity_reported = None
         self._state_status_bits = None
+        #(message, time received) of the last status update, for snapshot()
+        self._state_status = None
         #VELPARAMS
         self._state_min_velocity = None
         self._state_max_velocity = None
@@ -179,6 +127,15 @@ class GenericStage:
         self._state_home_direction = None
         self._state_home_limit_switch = None
         self._state_home_offset_distance = None
+        #Moves and homing started, and not completed or stopped yet
+        self._motion = threading.Condition()
+        self._move_pending = False
+        self._home_pending = False
+        #_state_* name -> time.monotonic() at which it was received (immune to clock changes)
+        self._timestamps = {}
+        #Parameters set by the user, restored by _reattach
+        self._user_velparams = None
+        self._user_homeparams = None
         
         
     def __del__(self):
@@ -191,21 +148,38 @@ class GenericStage:
             
         if isinstance(msg, MGMSG_MOT_GET_DCSTATUSUPDATE) or \
            isinstance(msg, MGMSG_MOT_GET_STATUSUPDATE) or \
-           isinstance(msg, MGMSG_MOT_MOVE_COMPLETED):
+           isinstance(msg, MGMSG_MOT_MOVE_COMPLETED) or \
+           isinstance(msg, MGMSG_MOT_MOVE_STOPPED):
             
+            now = time.monotonic()
             self._state_position = msg['position']
+            updated = ['_state_position', '_state_status_bits', '_state_status']
             if isinstance(msg, MGMSG_MOT_GET_DCSTATUSUPDATE):
                 self._state_velocity = msg['velocity']
+                self._state_velocity_reported = True
+                updated.extend(('_state_velocity', '_state_velocity_reported'))
+            elif isinstance(msg, MGMSG_MOT_GET_STATUSUPDATE):
+                self._state_velocity_reported = False
+                updated.append('_state_velocity_reported')
             self._state_status_bits = msg['status_bits']
+            #The snapshot timestamp is for the user: wall clock
+            self._state_status = (msg, time.time())
+            self._timestamps.update(dict.fromkeys(updated, now))
+            if isinstance(msg, MGMSG_MOT_MOVE_COMPLETED):
+                self._end_motion(move = True)
+            elif isinstance(msg, MGMSG_MOT_MOVE_STOPPED):
+                self._end_motion(move = True, home = True)
             return True
         
         if isinstance(msg, MGMSG_MOT_MOVE_HOMED):
+            self._end_motion(home = True)
             return True
         
         if isinstance(msg, MGMSG_MOT_GET_VELPARAMS):
             self._state_min_velocity = msg['min_velocity']
             self._state_max_velocity = msg['max_velocity']
             self._state_acceleration = msg['acceleration']
+            self._timestamps.update(dict.fromkeys(('_state_min_velocity', '_state_max_velocity', '_state_acceleration'), time.monotonic()))
             return True
         
         if isinstance(msg, MGMSG_MOT_GET_HOMEPARAMS):
@@ -213,6 +187,7 @@ class GenericStage:
             self._state_home_limit_switch = msg['limit_switch']
             self._state_home_velocity = msg['home_velocity']
             self._state_home_offset_distance = msg['offset_distance']
+            self._timestamps.update(dict.fromkeys(('_state_home_direction', '_state_home_limit_switch', '_state_home_velocity', '_state_home_offset_distance'), time.monotonic()))
             return True
             
         
@@ -220,103 +195,129 @@ class GenericStage:
     
     #STATUSUPDATE
     
+    def get_position(self, max_age = None, timeout = 3):
+        """Return the position.
+        
+        The controller streams status updates: the last one received is used
+        if it is at most max_age seconds old, and a new one is only requested
+        otherwise.
+        
+        :param max_age: maximum age of the value in seconds, None for any
+        :param timeout: seconds to wait for a new value
+        :raises TimeoutError: if the controller doesn't answer"""
+        position = self._read_state('_state_position', MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident), max_age, timeout)
+        return position / self._profile.position_factor
+    
+    def get_velocity(self, max_age = None, timeout = 3):
+        """Return the velocity, see :meth:`get_position`. None if the
+        controller doesn't report it (only DC servo controllers do)."""
+        if not self._read_state('_state_velocity_reported', MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident), max_age, timeout):
+            return None
+        #Received with _state_velocity_reported, as fresh
+        return self._state_velocity / self._profile.status_velocity_factor  #Dropped the 65536 factor, which resulted in false results
+    
+    def get_status_flags(self, max_age = None, timeout = 3):
+        """Return the decoded status bits as a :class:`StatusFlags`, see
+        :meth:`get_position`."""
+        return decode_status_bits(self._read_state('_state_status_bits', MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident), max_age, timeout))
+    
     @property
     def position(self):
-        self._wait_for_properties(('_state_position', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return self._state_position / self._EncCnt
+        return self.get_position()
 
     @position.setter
     def position(self, new_value):
         assert type(new_value) in (float, int)
-        absolute_distance = int(new_value * self._EncCnt)
-        self._port.send_message(MGMSG_MOT_MOVE_ABSOLUTE_long(chan_ident = self._chan_ident, absolute_distance = absolute_distance))
+        self.move_to(new_value)
 
     @property
     def velocity(self):
-        self._wait_for_properties(('_state_velocity', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return self._state_velocity / (self._EncCnt * self._T)  #Dropped the 65536 factor, which resulted in false results
+        return self.get_velocity()
 
     @property
     def status_forward_hardware_limit_switch_active(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00000001) != 0
+        return self.get_status_flags().forward_hardware_limit_switch_active
 
     @property
     def status_reverse_hardware_limit_switch_active(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00000002) != 0
+        return self.get_status_flags().reverse_hardware_limit_switch_active
 
     @property
     def status_in_motion_forward(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00000010) != 0
+        return self.get_status_flags().in_motion_forward
 
     @property
     def status_in_motion_reverse(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00000020) != 0
+        return self.get_status_flags().in_motion_reverse
 
     @property
     def status_in_motion_jogging_forward(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00000040) != 0
+        return self.get_status_flags().in_motion_jogging_forward
 
     @property
     def status_in_motion_jogging_reverse(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00000080) != 0
+        return self.get_status_flags().in_motion_jogging_reverse
 
     @property
     def status_in_motion_homing(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00000200) != 0
+        return self.get_status_flags().in_motion_homing
 
     @property
     def status_homed(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00000400) != 0
+        return self.get_status_flags().homed
 
     @property
     def status_tracking(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00001000) != 0
+        return self.get_status_flags().tracking
 
     @property
     def status_settled(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00002000) != 0
+        return self.get_status_flags().settled
 
     @property
     def status_motion_error(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x00004000) != 0
+        return self.get_status_flags().motion_error
 
     @property
     def status_motor_current_limit_reached(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x01000000) != 0
+        return self.get_status_flags().motor_current_limit_reached
 
     @property
     def status_channel_enabled(self):
-        self._wait_for_properties(('_state_status_bits', ), timeout = 3, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident))
-        return (self._state_status_bits & 0x80000000) != 0
+        return self.get_status_flags().channel_enabled
+    
+    def snapshot(self, max_age = None, timeout = 3):
+        """Return the state of the stage as a :class:`StageSnapshot`: position,
+        velocity and all status flags, from a single status update.
+        
+        The last status update sent by the controller is used if it is at
+        most max_age seconds old, so refreshing many stages doesn't need a
+        round trip for each.
+        
+        :param max_age: maximum age of the status update in seconds, None for any
+        :param timeout: seconds to wait for a status update
+        :raises TimeoutError: if the controller doesn't send one"""
+        if not self._wait_for_properties(('_state_status', ), timeout = timeout, message = MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident), max_age = max_age):
+            raise TimeoutError("No status update from {0!r}".format(self))
+        msg, timestamp = self._state_status
+        return StageSnapshot.from_message(self._profile, msg, timestamp)
     
     #VELPARAMS
     
     @property
     def min_velocity(self):
         self._wait_for_properties(('_state_min_velocity', ), timeout = 3, message = MGMSG_MOT_REQ_VELPARAMS(chan_ident = self._chan_ident))
-        return self._state_min_velocity / (self._EncCnt * self._T * 65536)
+        return self._state_min_velocity / self._profile.velocity_factor
     
     @property
     def max_velocity(self):
         self._wait_for_properties(('_state_max_velocity', ), timeout = 3, message = MGMSG_MOT_REQ_VELPARAMS(chan_ident = self._chan_ident))
-        return self._state_max_velocity / (self._EncCnt * self._T * 65536)
+        return self._state_max_velocity / self._profile.velocity_factor
     
     @property
     def acceleration(self):
         self._wait_for_properties(('_state_acceleration', ), timeout = 3, message = MGMSG_MOT_REQ_VELPARAMS(chan_ident = self._chan_ident))
-        return self._state_acceleration / (self._EncCnt * (self._T ** 2) * 65536)
+        return self._state_acceleration / self._profile.acceleration_factor
     
     @min_velocity.setter
     def min_velocity(self, new_value):
@@ -333,11 +334,12 @@ class GenericStage:
     def _set_velparams(self, min_velocity, max_velocity, acceleration):
         msg = MGMSG_MOT_SET_VELPARAMS(
             chan_ident = self._chan_ident,
-            min_velocity = int(min_velocity *(self._EncCnt * self._T * 65536)),
-            max_velocity = int(max_velocity *(self._EncCnt * self._T * 65536)),
-            acceleration = int(acceleration *(self._EncCnt * (self._T ** 2) * 65536)),
+            min_velocity = int(min_velocity * self._profile.velocity_factor),
+            max_velocity = int(max_velocity * self._profile.velocity_factor),
+            acceleration = int(acceleration * self._profile.acceleration_factor),
         )
         self._port.send_message(msg)
+        self._user_velparams = (min_velocity, max_velocity, acceleration)
         #Invalidate current values
         self._state_min_velocity = None
         self._state_max_velocity = None
@@ -349,7 +351,7 @@ class GenericStage:
     @property
     def home_velocity(self):
         self._wait_for_properties(('_state_home_velocity', ), timeout = 3, message = MGMSG_MOT_REQ_HOMEPARAMS(chan_ident = self._chan_ident))
-        return self._state_home_velocity / (self._EncCnt * self._T * 65536)
+        return self._state_home_velocity / self._profile.velocity_factor
     
     @home_velocity.setter
     def home_velocity(self, new_value):
@@ -368,17 +370,18 @@ class GenericStage:
     @property
     def home_offset_distance(self):
         self._wait_for_properties(('_state_home_offset_distance', ), timeout = 3, message = MGMSG_MOT_REQ_HOMEPARAMS(chan_ident = self._chan_ident))
-        return self._state_home_offset_distance / self._EncCnt
+        return self._state_home_offset_distance / self._profile.position_factor
     
     def _set_homeparams(self, home_velocity, home_direction, home_limit_switch, home_offset_distance):
         msg = MGMSG_MOT_SET_HOMEPARAMS( 
             chan_ident = self._chan_ident,
-            home_velocity = int(home_velocity *(self._EncCnt * self._T * 65536)),
+            home_velocity = int(home_velocity * self._profile.velocity_factor),
             home_direction = home_direction,
             limit_switch = home_limit_switch,
-            offset_distance = int(home_offset_distance*self._EncCnt)
+            offset_distance = int(home_offset_distance * self._profile.position_factor)
         )
         self._port.send_message(msg)
+        self._user_homeparams = (home_velocity, home_direction, home_limit_switch, home_offset_distance)
         #Invalidate current values
         self._state_home_velocity = None
         self._state_home_direction = None
@@ -386,53 +389,52 @@ class GenericStage:
         self._state_home_offset_distance = None
 
     
-    #Conversion factors
     @property
-    def _EncCnt(self):
-        return self._conf_steps_per_rev * self._conf_gearbox_ratio / self._conf_pitch
-    
-    @property
-    def _T(self):
-        return 2048 / 6e6
+    def profile(self):
+        """:class:`~thorpy.stages.profiles.StageProfile` of the stage"""
+        return self._profile
     
     @property
     def units(self):
-        return {1: 'mm', 2: '°'}[self._conf_units]
+        return self._profile.unit_name
     
     def print_state(self):
+        snapshot = self.snapshot()
         print("Stage: {0}".format(self._name))
-        print("Position: {0:0.03f}{1}".format(self.position, self.units))
+        print("Position: {0:0.03f}{1}".format(snapshot.position, self.units))
         # Velocity information not available with some stages, e.g. LTS300
-        #print("Velocity: {0:0.03f}{1}/s".format(self.velocity, self.units))
+        if snapshot.velocity is not None:
+            print("Velocity: {0:0.03f}{1}/s".format(snapshot.velocity, self.units))
         
+        status = snapshot.flags
         flags = []
-        if self.status_forward_hardware_limit_switch_active:
+        if status.forward_hardware_limit_switch_active:
             flags.append("forward hardware limit switch is active")
-        if self.status_reverse_hardware_limit_switch_active:
+        if status.reverse_hardware_limit_switch_active:
             flags.append("reverse hardware limit switch is active")
-        if self.status_in_motion_forward or self.status_in_motion_reverse or self.status_in_motion_jogging_forward or self.status_in_motion_jogging_reverse or self.status_in_motion_homing:
+        if status.in_motion:
             flags.append('in motion')
-        if self.status_in_motion_forward:
+        if status.in_motion_forward:
             flags.append('moving forward')
-        if self.status_in_motion_reverse:
+        if status.in_motion_reverse:
             flags.append('moving reverse')
-        if self.status_in_motion_jogging_forward:
+        if status.in_motion_jogging_forward:
             flags.append('jogging forward')
-        if self.status_in_motion_jogging_reverse:
+        if status.in_motion_jogging_reverse:
             flags.append('jogging reverse')
-        if self.status_in_motion_homing:
+        if status.in_motion_homing:
             flags.append('homing')
-        if self.status_homed:
+        if status.homed:
             flags.append('homed')
-        if self.status_tracking:
+        if status.tracking:
             flags.append('tracking')
-        if self.status_settled:
+        if status.settled:
             flags.append('settled')
-        if self.status_motion_error:
+        if status.motion_error:
             flags.append('motion error')
-        if self.status_motor_current_limit_reached:
+        if status.motor_current_limit_reached:
             flags.append('motor current limit reached')
-        if self.status_channel_enabled:
+        if status.channel_enabled:
             flags.append('channel enabled')
             
         print("Status: {0}".format(', '.join(flags)))
@@ -441,36 +443,226 @@ class GenericStage:
         print("Velocity parameters: velocity: {0.min_velocity:0.3f}-{0.max_velocity:0.3f}{0.units}/s, acceleration: {0.acceleration:0.3f}{0.units}/s²".format(self))
         print("Homing parameters: velocity: {0.home_velocity:0.3f}{0.units}/s, direction: {0.home_direction}, limit_switch: {0.home_limit_switch}, offset_distance: {0.home_offset_distance:0.3f}{0.units}".format(self))
         
-    def home(self, force = False):
+    def home(self, force = False, timeout = None):
+        """Home the stage, unless it is already homed (and force is False).
+
+        :param timeout: seconds, None to wait forever
+        :returns: True once homed, False if homing was stopped
+        :raises TimeoutError: if homing isn't over within timeout"""
         if self.status_homed and not force:
             return True
-        
-        while not self.status_homed:
-            if not self.status_in_motion_forward and not self.status_in_motion_reverse:
-                self._port.send_message(MGMSG_MOT_MOVE_HOME(chan_ident = self._chan_ident))
-            time.sleep(1)
 
-        return True
+        #Registered before sending, so that the reply can't be missed
+        reply = self._port.expect((MGMSG_MOT_MOVE_HOMED, MGMSG_MOT_MOVE_STOPPED), self._chan_ident)
+        try:
+            self.home_async(force = True)
+            msg = reply.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError("Homing of {0!r} not over after {1}s".format(self, timeout))
+        finally:
+            reply.cancel()
+        return isinstance(msg, MGMSG_MOT_MOVE_HOMED)
 
     def home_non_blocking(self, force = True ):
         if self.status_homed and not force:
             return True
         
-        self._port.send_message(MGMSG_MOT_MOVE_HOME(chan_ident = self._chan_ident))     
+        self._start_motion(MGMSG_MOT_MOVE_HOME(chan_ident = self._chan_ident), home = True)
         return True
+    
+    def home_async(self, force = False):
+        """Start homing the stage, unless it is already homed (and force is
+        False).
+        
+        :returns: a :class:`concurrent.futures.Future` resolved with the
+            position once homed (0) or stopped"""
+        if not force and self.status_homed:
+            future = concurrent.futures.Future()
+            future.set_result(self.position)
+            return future
+        return self._start_motion(MGMSG_MOT_MOVE_HOME(chan_ident = self._chan_ident), home = True)
+    
+    def move_to(self, position):
+        """Start a move to an absolute position.
+        
+        :returns: a :class:`concurrent.futures.Future` resolved with the final
+            position once the move is completed or stopped"""
+        absolute_distance = int(position * self._profile.position_factor)
+        return self._start_motion(MGMSG_MOT_MOVE_ABSOLUTE_long(chan_ident = self._chan_ident, absolute_distance = absolute_distance))
+    
+    def move_by(self, distance):
+        """Start a move by a relative distance, see :meth:`move_to`."""
+        relative_distance = int(distance * self._profile.position_factor)
+        return self._start_motion(MGMSG_MOT_MOVE_RELATIVE_long(chan_ident = self._chan_ident, relative_distance = relative_distance))
+    
+    def jog(self, forward = True):
+        """Start a jog, with the jog parameters of the controller, see
+        :meth:`move_to`."""
+        return self._start_motion(MGMSG_MOT_MOVE_JOG(chan_ident = self._chan_ident, direction = 0x01 if forward else 0x02))
+    
+    def move_velocity(self, forward = True):
+        """Start moving at the maximum velocity (see :attr:`max_velocity`)
+        until :meth:`stop` is called.
+        
+        :returns: a :class:`concurrent.futures.Future` resolved with the final
+            position once stopped"""
+        return self._start_motion(MGMSG_MOT_MOVE_VELOCITY(chan_ident = self._chan_ident, direction = 0x01 if forward else 0x02),
+                                  completion = (MGMSG_MOT_MOVE_STOPPED, ))
+    
+    def stop(self, immediate = False):
+        """Stop any move.
+        
+        :returns: a :class:`concurrent.futures.Future` resolved with the final
+            position once stopped"""
+        future = self._expect_position((MGMSG_MOT_MOVE_STOPPED, ))
+        self._port.send_message(MGMSG_MOT_MOVE_STOP(chan_ident = self._chan_ident, stop_mode = 0x01 if immediate else 0x02))
+        return future
+    
+    def _start_motion(self, msg, home = False, completion = None):
+        future = self._prepare_motion(home, completion)
+        self._port.send_message(msg)
+        return future
+    
+    def _prepare_motion(self, home = False, completion = None):
+        """Mark a move (or homing) pending, and return the future of
+        :meth:`_expect_position`. To be called before sending the command, so
+        that the completion can't be missed."""
+        if completion is None:
+            completion = (MGMSG_MOT_MOVE_HOMED if home else MGMSG_MOT_MOVE_COMPLETED, MGMSG_MOT_MOVE_STOPPED)
+        with self._motion:
+            if home:
+                self._home_pending = True
+            else:
+                self._move_pending = True
+        future = self._expect_position(completion)
+        #Cancelled (e.g. port closed, or timeout of a StageGroup): don't wait for the completion anymore
+        future.add_done_callback(lambda future: self._end_motion(move = not home, home = home) if future.cancelled() else None)
+        return future
+    
+    def _expect_position(self, completion):
+        """Return a future resolved with the position from the first of the
+        completion messages."""
+        reply = self._port.expect(completion, self._chan_ident)
+        future = concurrent.futures.Future()
+        
+        def reply_done(reply):
+            if reply.cancelled():
+                future.cancel()
+                return
+            if not future.set_running_or_notify_cancel():
+                return
+            msg = reply.result()
+            if isinstance(msg, MGMSG_MOT_MOVE_HOMED):
+                #Homing sets the position to 0, and MOVE_HOMED has no position
+                future.set_result(0.0)
+            else:
+                future.set_result(msg['position'] / self._profile.position_factor)
+        
+        def future_done(future):
+            if future.cancelled():
+                reply.cancel()
+        
+        reply.add_done_callback(reply_done)
+        future.add_done_callback(future_done)
+        return future
+    
+    def _end_motion(self, move = False, home = False):
+        with self._motion:
+            if move:
+                self._move_pending = False
+            if home:
+                self._home_pending = False
+            self._motion.notify_all()
+    
+    def wait_for_move(self, timeout = None):
+        """Wait until the last move started (e.g. by setting :attr:`position`)
+        is completed or stopped, woken up by MGMSG_MOT_MOVE_COMPLETED or
+        MGMSG_MOT_MOVE_STOPPED.
+        
+        :param timeout: seconds, None to wait forever
+        :returns: False on timeout, True otherwise (also if no move was started)"""
+        with self._motion:
+            return self._motion.wait_for(lambda: not self._move_pending, timeout)
+    
+    def wait_for_home(self, timeout = None):
+        """Wait until homing (see :meth:`home_non_blocking`) is completed or
+        stopped, woken up by MGMSG_MOT_MOVE_HOMED or MGMSG_MOT_MOVE_STOPPED.
+        
+        :param timeout: seconds, None to wait forever
+        :returns: False on timeout, True otherwise (also if not homing)"""
+        with self._motion:
+            return self._motion.wait_for(lambda: not self._home_pending, timeout)
 
-    def _wait_for_properties(self, properties, timeout = None, message = None, message_repeat_timeout = None):
-        start_time = time.time()
+    def _reattach(self, port):
+        """Use port, a new port to the same controller (e.g. after it was
+        power-cycled), and set again the parameters set by the user."""
+        self._port = port
+        for k in [k for k in vars(self) if k.startswith('_state_')]:
+            setattr(self, k, None)
+        #Motions were interrupted by the power cycle
+        self._end_motion(move = True, home = True)
+        self._port.send_message(MGMSG_MOD_SET_CHANENABLESTATE(chan_ident = self._chan_ident, chan_enable_state = 0x01))
+        if self._user_velparams is not None:
+            self._set_velparams(*self._user_velparams)
+        if self._user_homeparams is not None:
+            self._set_homeparams(*self._user_homeparams)
+        
+    def _read_state(self, prop, message, max_age, timeout):
+        if not self._wait_for_properties((prop, ), timeout = timeout, message = message, max_age = max_age):
+            raise TimeoutError("No answer to {0} from {1!r}".format(type(message).__name__, self))
+        return getattr(self, prop)
+    
+    def _wait_for_properties(self, properties, timeout = None, message = None, message_repeat_timeout = None, reply_classes = None, max_age = None):
+        """Wait until all properties are known, requesting them with message.
+        
+        Returns as soon as the reply is handled (or any other message with
+        the properties, e.g. a status update sent by the controller).
+        
+        :param max_age: if not None, values received more than max_age seconds
+            before the call are requested again"""
+        if reply_classes is None and message is not None:
+            reply_classes = message.reply_classes()
+        start_time = time.monotonic()
+        oldest = None if max_age is None else start_time - max_age
+        def missing(prop):
+            if getattr(self, prop) is None:
+                return True
+            return oldest is not None and self._timestamps.get(prop, float('-inf')) < oldest
+        
         last_message_time = 0
-        while any(getattr(self, prop) is None for prop in properties):
-            if message is not None:
-                if last_message_time == 0 or (message_repeat_timeout is not None and time.time() - last_message_time > message_repeat_timeout):
-                    self._port.send_message(message)
-                    last_message_time = time.time()
-            time.sleep(0.1)
-            if timeout is not None and time.time() - start_time >= timeout:
-                return False
-        return True
+        future = None
+        try:
+            while any(missing(prop) for prop in properties):
+                if future is None or future.done():
+                    #Registered before sending, so that the reply can't be missed
+                    future = self._port.expect(reply_classes or (), self._chan_ident)
+                    if not isinstance(future, concurrent.futures.Future):
+                        raise TypeError("Can't wait for a reply from {0!r} in a blocking call, use the AsyncStage coroutines".format(self._port))
+                
+                if message is not None:
+                    if last_message_time == 0 or (message_repeat_timeout is not None and time.monotonic() - last_message_time > message_repeat_timeout):
+                        self._port.send_message(message)
+                        last_message_time = time.monotonic()
+                
+                wait = None
+                if timeout is not None:
+                    wait = timeout - (time.monotonic() - start_time)
+                    if wait <= 0:
+                        return False
+                if message_repeat_timeout is not None:
+                    wait = message_repeat_timeout if wait is None else min(wait, message_repeat_timeout)
+                if not reply_classes:
+                    #Nothing to wait for, poll
+                    wait = 0.1 if wait is None else min(wait, 0.1)
+                
+                try:
+                    future.result(wait)
+                except concurrent.futures.TimeoutError:
+                    pass
+            return True
+        finally:
+            if future is not None:
+                future.cancel()
         
     def __repr__(self):
         return '<{0} on {1!r} channel {2}>'.format(self._name, self._port, self._chan_ident)
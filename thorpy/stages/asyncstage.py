@@ -0,0 +1,102 @@
+from thorpy.message import *
+import time
+
+from .status import StageSnapshot, decode_status_bits
+
+class AsyncStage:
+    """:mod:`asyncio` façade of a :class:`GenericStage` connected through an
+    :class:`~thorpy.comm.asyncport.AsyncPort`.
+    
+    Every method is a coroutine which returns as soon as the controller
+    answers, without blocking the event loop::
+    
+        position = await stage.get_position()
+        await stage.home()
+        await stage.move_to(position + 1)
+    
+    :param stage: the stage
+    :type stage: GenericStage
+    :param timeout: default timeout of requests, in seconds (None to wait forever)"""
+    
+    def __init__(self, stage, timeout = 3):
+        self._stage = stage
+        self._port = stage._port
+        self._chan_ident = stage._chan_ident
+        self.timeout = timeout
+    
+    @property
+    def stage(self):
+        """The wrapped :class:`GenericStage`, for its profile and settings.
+
+        Its blocking readers (properties such as :attr:`GenericStage.min_velocity`,
+        :meth:`GenericStage.get_position`...) can't be used on an
+        :class:`~thorpy.comm.asyncport.AsyncPort`, and raise TypeError: use
+        the coroutines of this class instead."""
+        return self._stage
+    
+    @property
+    def units(self):
+        return self._stage.units
+    
+    async def _request_status(self):
+        return await self._port.request(MGMSG_MOT_REQ_STATUSUPDATE(chan_ident = self._chan_ident),
+                                        (MGMSG_MOT_GET_STATUSUPDATE, MGMSG_MOT_GET_DCSTATUSUPDATE),
+                                        self._chan_ident, self.timeout)
+    
+    async def get_position(self):
+        """Request a status update and return the position."""
+        msg = await self._request_status()
+        return msg['position'] / self._stage._profile.position_factor
+    
+    async def get_velocity(self):
+        """Request a status update and return the velocity (DC servo controllers only)."""
+        msg = await self._port.request(MGMSG_MOT_REQ_DCSTATUSUPDATE(chan_ident = self._chan_ident),
+                                       (MGMSG_MOT_GET_DCSTATUSUPDATE, ),
+                                       self._chan_ident, self.timeout)
+        return msg['velocity'] / self._stage._profile.status_velocity_factor
+    
+    async def snapshot(self):
+        """Request a status update and return it as a
+        :class:`~thorpy.stages.status.StageSnapshot`."""
+        msg = await self._request_status()
+        return StageSnapshot.from_message(self._stage._profile, msg, time.time())
+    
+    async def get_status_bits(self):
+        """Request a status update and return the status bits (see
+        :class:`~thorpy.message.motorcontrol.MGMSG_MOT_MOVE_COMPLETED`)."""
+        msg = await self._request_status()
+        return msg['status_bits']
+    
+    async def _move(self, msg, timeout):
+        reply = await self._port.request(msg, (MGMSG_MOT_MOVE_COMPLETED, MGMSG_MOT_MOVE_STOPPED), self._chan_ident, timeout)
+        return reply['position'] / self._stage._profile.position_factor
+    
+    async def move_to(self, position, timeout = None):
+        """Move to an absolute position, and return the final position once the
+        move is completed (or stopped)."""
+        absolute_distance = int(position * self._stage._profile.position_factor)
+        return await self._move(MGMSG_MOT_MOVE_ABSOLUTE_long(chan_ident = self._chan_ident, absolute_distance = absolute_distance), timeout)
+    
+    async def move_by(self, distance, timeout = None):
+        """Move by a relative distance, and return the final position once the
+        move is completed (or stopped)."""
+        relative_distance = int(distance * self._stage._profile.position_factor)
+        return await self._move(MGMSG_MOT_MOVE_RELATIVE_long(chan_ident = self._chan_ident, relative_distance = relative_distance), timeout)
+    
+    async def home(self, force = False, timeout = None):
+        """Home the stage, unless it is already homed (and force is False).
+        
+        Returns True once homed, False if homing was stopped."""
+        if not force and decode_status_bits(await self.get_status_bits()).homed:
+            return True
+        reply = await self._port.request(MGMSG_MOT_MOVE_HOME(chan_ident = self._chan_ident), (MGMSG_MOT_MOVE_HOMED, MGMSG_MOT_MOVE_STOPPED), self._chan_ident, timeout)
+        return isinstance(reply, MGMSG_MOT_MOVE_HOMED)
+    
+    async def stop(self, immediate = False, timeout = None):
+        """Stop any move, and return the final position."""
+        msg = MGMSG_MOT_MOVE_STOP(chan_ident = self._chan_ident, stop_mode = 0x01 if immediate else 0x02)
+        reply = await self._port.request(msg, (MGMSG_MOT_MOVE_STOPPED, ), self._chan_ident, timeout)
+        return reply['position'] / self._stage._profile.position_factor
+    
+    def __repr__(self):
+        return '<{0} {1!r}>'.format(self.__class__.__name__, self._stage)
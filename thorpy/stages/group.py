@@ -0,0 +1,86 @@
+from thorpy.message import *
+import collections
+import threading
+import time
+
+class GroupMoveResult(collections.namedtuple('GroupMoveResult', 'positions start_skew durations')):
+    """Outcome of :meth:`StageGroup.move_to`.
+
+    :param positions: final position of each stage
+    :param start_skew: seconds between the first and the last move command
+        written
+    :param durations: seconds from writing the move command of each stage
+        to its completion"""
+    __slots__ = ()
+
+class StageGroup:
+    """Stages, possibly on different controllers, moved together (e.g. the XYZ
+    axes of a setup)::
+
+        group = StageGroup([x, y, z])
+        result = group.move_to([1, 2, 0.5])
+        print(result.start_skew, result.durations)
+
+    The move commands are encoded beforehand, and written back-to-back from
+    the calling thread, so that the axes start as close together as possible.
+
+    :param stages: list of :class:`~thorpy.stages.GenericStage`"""
+
+    def __init__(self, stages):
+        self._stages = list(stages)
+
+    @property
+    def stages(self):
+        return list(self._stages)
+
+    def __len__(self):
+        return len(self._stages)
+
+    def move_to(self, positions, timeout = None):
+        """Move every stage to its absolute position, and wait until all moves
+        are completed (or stopped).
+
+        :param positions: one position per stage, in the order of the stages
+        :param timeout: seconds to wait for the completions, None to wait forever
+        :rtype: GroupMoveResult
+        :raises TimeoutError: if a move is not completed within timeout"""
+        positions = list(positions)
+        if len(positions) != len(self._stages):
+            raise ValueError("Expected {0} positions, got {1}".format(len(self._stages), len(positions)))
+
+        frames = []
+        for stage, position in zip(self._stages, positions):
+            msg = MGMSG_MOT_MOVE_ABSOLUTE_long(chan_ident = stage._chan_ident,
+                                               absolute_distance = int(position * stage._profile.position_factor))
+            frames.append((stage._port, stage._port.encode_message(msg)))
+
+        futures = [stage._prepare_motion() for stage in self._stages]
+        #Completion times, taken in the callbacks: the futures are done slightly before
+        end_times = [None] * len(futures)
+        completed = threading.Condition()
+        for i, future in enumerate(futures):
+            def done(future, i = i):
+                with completed:
+                    end_times[i] = time.perf_counter()
+                    completed.notify()
+            future.add_done_callback(done)
+
+        start_times = []
+        for port, frame in frames:
+            port.send_bytes(frame)
+            start_times.append(time.perf_counter())
+
+        with completed:
+            all_done = completed.wait_for(lambda: None not in end_times, timeout)
+        if not all_done:
+            not_done = [i for i, future in enumerate(futures) if not future.done()]
+            for i in not_done:
+                futures[i].cancel()
+            raise TimeoutError("Moves of {0} not completed".format(', '.join(repr(self._stages[i]) for i in not_done)))
+
+        return GroupMoveResult(positions = [future.result() for future in futures],
+                               start_skew = start_times[-1] - start_times[0],
+                               durations = [end - start for start, end in zip(start_times, end_times)])
+
+    def __repr__(self):
+        return '<{0} {1!r}>'.format(self.__class__.__name__, self._stages)
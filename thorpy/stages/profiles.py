@@ -0,0 +1,157 @@
+import configparser
+import pkgutil
+import threading
+
+#(name, INI option, type) of the stage parameters
+_options = [
+    ('stage_id', 'Stage ID', 'int'),
+    ('axis_id', 'Axis ID', 'int'),
+    ('units', 'Units', 'int'),
+    ('pitch', 'Pitch', 'float'),
+    ('dir_sense', 'Dir Sense', 'int'),
+    ('min_pos', 'Min Pos', 'float'),
+    ('max_pos', 'Max Pos', 'float'),
+    ('def_min_vel', 'Def Min Vel', 'float'),
+    ('def_accn', 'Def Accn', 'float'),
+    ('def_max_vel', 'Def Max Vel', 'float'),
+    ('max_accn', 'Max Accn', 'float'),
+    ('max_vel', 'Max Vel', 'float'),
+    ('backlash_dist', 'Backlash Dist', 'float'),
+    ('move_factor', 'Move Factor', 'int'),
+    ('rest_factor', 'Rest Factor', 'int'),
+    ('cw_hard_limit', 'CW Hard Limit', 'int'),
+    ('ccw_hard_limit', 'CCW Hard Limit', 'int'),
+    ('cw_soft_limit', 'CW Soft Limit', 'float'),
+    ('ccw_soft_limit', 'CCW Soft Limit', 'float'),
+    ('soft_limit_mode', 'Soft Limit Mode', 'int'),
+    ('home_dir', 'Home Dir', 'int'),
+    ('home_limit_switch', 'Home Limit Switch', 'int'),
+    ('home_vel', 'Home Vel', 'float'),
+    ('home_zero_offset', 'Home Zero Offset', 'float'),
+    ('jog_mode', 'Jog Mode', 'int'),
+    ('jog_step_size', 'Jog Step Size', 'float'),
+    ('jog_min_vel', 'Jog Min Vel', 'float'),
+    ('jog_accn', 'Jog Accn', 'float'),
+    ('jog_max_vel', 'Jog Max Vel', 'float'),
+    ('jog_stop_mode', 'Jog Stop Mode', 'int'),
+    ('steps_per_rev', 'Steps Per Rev', 'int'),
+    ('gearbox_ratio', 'Gearbox Ratio', 'int'),
+]
+
+#Flag (name, INI option) -> options only present if the flag is set
+_optional_options = {
+    ('dc_servo', 'DC Servo'): [
+        ('dc_prop', 'DC Prop', 'int'),
+        ('dc_int', 'DC Int', 'int'),
+        ('dc_diff', 'DC Diff', 'int'),
+        ('dc_intlim', 'DC IntLim', 'int'),
+    ],
+    ('fp_controls', 'FP Controls'): [
+        ('pot_zero_wnd', 'Pot Zero Wnd', 'int'),
+        ('pot_vel_1', 'Pot Vel 1', 'float'),
+        ('pot_wnd_1', 'Pot Wnd 1', 'int'),
+        ('pot_vel_2', 'Pot Vel 2', 'float'),
+        ('pot_wnd_2', 'Pot Wnd 2', 'int'),
+        ('pot_vel_3', 'Pot Vel 3', 'float'),
+        ('pot_wnd_3', 'Pot Wnd 3', 'int'),
+        ('pot_vel_4', 'Pot Vel 4', 'float'),
+        ('button_mode', 'Button Mode', 'int'),
+        ('button_pos_1', 'Button Pos 1', 'float'),
+        ('button_pos_2', 'Button Pos 2', 'float'),
+    ],
+    ('js_params', 'JS Params'): [
+        ('js_gearlow_maxvel', 'JS GearLow MaxVel', 'float'),
+        ('js_gearlow_accn', 'JS GearLow Accn', 'float'),
+        ('js_dir_sense', 'JS Dir Sense', 'float'),
+    ],
+}
+
+#Time unit of the velocities and accelerations, in seconds
+_T = 2048 / 6e6
+
+class StageProfile:
+    """Parameters of a stage type, from MG17APTServer.ini. Immutable, and
+    shared by all the stages of the same type (see :func:`get_stage_profile`).
+    
+    Besides the INI parameters (None if not given for this stage), it has
+    the scale factors from physical units (mm or °) to device units:
+    
+    - position_factor: encoder counts per unit
+    - velocity_factor: velocity parameters (e.g. MGMSG_MOT_SET_VELPARAMS)
+      per unit/s
+    - acceleration_factor: acceleration parameters per unit/s²
+    - status_velocity_factor: velocity of MGMSG_MOT_GET_DCSTATUSUPDATE per unit/s"""
+    
+    __slots__ = ('name', ) + \
+        tuple(name for name, option, type in _options) + \
+        tuple(flag for flag, flag_option in _optional_options) + \
+        tuple(name for options in _optional_options.values() for name, option, type in options) + \
+        ('position_factor', 'velocity_factor', 'acceleration_factor', 'status_velocity_factor')
+    
+    def __init__(self, name, **parameters):
+        set = super().__setattr__
+        for k in self.__slots__:
+            set(k, None)
+        set('name', name)
+        for k, v in parameters.items():
+            set(k, v)
+        
+        encoder_counts = self.steps_per_rev * self.gearbox_ratio / self.pitch
+        set('position_factor', encoder_counts)
+        set('velocity_factor', encoder_counts * _T * 65536)
+        set('acceleration_factor', encoder_counts * (_T ** 2) * 65536)
+        set('status_velocity_factor', encoder_counts * _T)
+    
+    def __setattr__(self, k, v):
+        raise AttributeError("StageProfile is immutable")
+    
+    def __delattr__(self, k):
+        raise AttributeError("StageProfile is immutable")
+    
+    @property
+    def unit_name(self):
+        return {1: 'mm', 2: '°'}[self.units]
+    
+    def __repr__(self):
+        return '<{0} {1!r}>'.format(self.__class__.__name__, self.name)
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+def _parse_section(config, section):
+    def get(option, type):
+        return getattr(config, 'get' + type)(section, option)
+
+    ret = dict((name, get(option, type)) for name, option, type in _options)
+    for (flag, flag_option), options in _optional_options.items():
+        ret[flag] = config.getboolean(section, flag_option, fallback = False)
+        if ret[flag]:
+            ret.update((name, get(option, type)) for name, option, type in options)
+    return StageProfile(section, **ret)
+
+def stage_profiles():
+    """Return the parameters of all stages of MG17APTServer.ini, as a dict
+    stage name -> :class:`StageProfile`. The file is only parsed once per
+    process."""
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            config = configparser.ConfigParser()
+            config.read_string(pkgutil.get_data('thorpy.stages', 'MG17APTServer.ini').decode('ascii'))
+            profiles = {}
+            for section in config.sections():
+                try:
+                    profiles[section] = _parse_section(config, section)
+                except (configparser.NoOptionError, ValueError):
+                    pass  #Not a stage (e.g. Stepper Stages)
+            _profiles = profiles
+        return _profiles
+
+def get_stage_profile(name):
+    """Return the parameters of stage name, see :func:`stage_profiles`.
+
+    :raises configparser.NoSectionError: if the stage is unknown"""
+    try:
+        return stage_profiles()[name]
+    except KeyError:
+        raise configparser.NoSectionError(name)
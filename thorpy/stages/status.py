@@ -0,0 +1,67 @@
+import collections
+import functools
+
+#(name, mask) of the status bits, see MGMSG_MOT_GET_STATUSUPDATE
+_status_flags = [
+    ('forward_hardware_limit_switch_active', 0x00000001),
+    ('reverse_hardware_limit_switch_active', 0x00000002),
+    ('in_motion_forward', 0x00000010),
+    ('in_motion_reverse', 0x00000020),
+    ('in_motion_jogging_forward', 0x00000040),
+    ('in_motion_jogging_reverse', 0x00000080),
+    ('in_motion_homing', 0x00000200),
+    ('homed', 0x00000400),
+    ('tracking', 0x00001000),
+    ('settled', 0x00002000),
+    ('motion_error', 0x00004000),
+    ('motor_current_limit_reached', 0x01000000),
+    ('channel_enabled', 0x80000000),
+]
+
+class StatusFlags(collections.namedtuple('StatusFlags', [name for name, mask in _status_flags])):
+    """Decoded status bits, see :func:`decode_status_bits`."""
+    __slots__ = ()
+
+    @property
+    def in_motion(self):
+        return self.in_motion_forward or self.in_motion_reverse or \
+            self.in_motion_jogging_forward or self.in_motion_jogging_reverse or \
+            self.in_motion_homing
+
+    def names(self):
+        """Return the names of the flags which are set."""
+        return [name for name, value in zip(self._fields, self) if value]
+
+@functools.lru_cache(maxsize = 256)
+def decode_status_bits(status_bits):
+    """Decode all the flags of a status bits word at once.
+
+    The result is immutable, and cached: few distinct words are seen in
+    practice, even with many stages.
+
+    :param status_bits: status bits of MGMSG_MOT_GET_STATUSUPDATE,
+        MGMSG_MOT_GET_DCSTATUSUPDATE, MGMSG_MOT_MOVE_COMPLETED...
+    :rtype: StatusFlags"""
+    return StatusFlags._make((status_bits & mask) != 0 for name, mask in _status_flags)
+
+class StageSnapshot(collections.namedtuple('StageSnapshot', 'position velocity status_bits flags timestamp')):
+    """State of a stage from a single status update: position, velocity (None
+    if the message doesn't carry it), status bits with their decoded
+    :class:`StatusFlags`, and the time.time() at which the update was
+    received."""
+    __slots__ = ()
+
+    @classmethod
+    def from_message(cls, profile, msg, timestamp):
+        """Build a snapshot from a status message.
+
+        :param profile: :class:`~thorpy.stages.profiles.StageProfile` of the stage
+        :param msg: MGMSG_MOT_GET_STATUSUPDATE, MGMSG_MOT_GET_DCSTATUSUPDATE or
+            MGMSG_MOT_MOVE_COMPLETED
+        :param timestamp: time at which msg was received"""
+        velocity = msg['velocity'] / profile.status_velocity_factor if 'velocity' in msg else None
+        return cls(position = msg['position'] / profile.position_factor,
+                   velocity = velocity,
+                   status_bits = msg['status_bits'],
+                   flags = decode_status_bits(msg['status_bits']),
+                   timestamp = timestamp)
@@ -0,0 +1,151 @@
+from thorpy.message import *
+import collections
+import threading
+import time
+
+class TrajectoryResult(collections.namedtuple('TrajectoryResult', 'points elapsed points_per_second position')):
+    """Outcome of :meth:`TrajectoryExecutor.run`.
+
+    :param points: number of points reached
+    :param elapsed: seconds from the first move command to the last completion
+    :param points_per_second: points / elapsed
+    :param position: final position (None if no point was reached)"""
+    __slots__ = ()
+
+class TrajectoryExecutor:
+    """Move a stage through a sequence of absolute positions, e.g. for a
+    point-by-point scan::
+
+        def acquire(index, position):
+            ...
+
+        result = TrajectoryExecutor(stage, (0.01 * i for i in range(10000)), acquire).run()
+        print(result.points_per_second)
+
+    The points are consumed lazily, a few ahead of the stage (their move
+    commands are encoded in advance), so generators of any length can be used.
+    Without callback, the next move command is written from the completion
+    handler itself, as soon as MGMSG_MOT_MOVE_COMPLETED is received. With a
+    callback, it is written as soon as the callback returns.
+
+    :param stage: :class:`~thorpy.stages.GenericStage`
+    :param points: iterable of positions
+    :param callback: called with (index, position reached) after each point,
+        from the thread calling :meth:`run`
+    :param timeout: seconds to wait for each move, None to wait forever
+    :param prefetch: number of points encoded ahead"""
+
+    def __init__(self, stage, points, callback = None, timeout = None, prefetch = 2):
+        self._stage = stage
+        self._points = points
+        self._callback = callback
+        self.timeout = timeout
+        self._prefetch = max(1, prefetch)
+        self._condition = threading.Condition()
+        self._stopping = False
+
+    def stop(self):
+        """Stop after the move in progress (it is not interrupted)."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+    def _encode(self, position):
+        msg = MGMSG_MOT_MOVE_ABSOLUTE_long(chan_ident = self._stage._chan_ident,
+                                           absolute_distance = int(position * self._stage._profile.position_factor))
+        return self._stage._port.encode_message(msg)
+
+    def _issue(self):
+        #Called with the condition held
+        frame = self._frames.popleft()
+        future = self._stage._prepare_motion()
+        self._in_flight = future
+        self._issue_time = time.perf_counter()
+        if self._start_time is None:
+            self._start_time = self._issue_time
+        future.add_done_callback(self._move_done)
+        self._stage._port.send_bytes(frame)
+
+    def _move_done(self, future):
+        #From the thread of the port
+        with self._condition:
+            if future is not self._in_flight:
+                return
+            self._in_flight = None
+            self._end_time = time.perf_counter()
+            if future.cancelled():
+                self._error = RuntimeError("Move of {0!r} cancelled (port closed?)".format(self._stage))
+            else:
+                self._reached.append(future.result())
+                if self._callback is None and not self._stopping and len(self._frames) > 0:
+                    self._issue()
+            self._condition.notify_all()
+
+    def run(self):
+        """Go through all points (or until :meth:`stop` is called).
+
+        :rtype: TrajectoryResult
+        :raises TimeoutError: if a move is not completed within timeout"""
+        iterator = iter(self._points)
+        self._stopping = False
+        self._frames = collections.deque()
+        self._reached = collections.deque()
+        self._in_flight = None
+        self._error = None
+        self._start_time = None
+        self._end_time = None
+        exhausted = False
+        count = 0
+        position = None
+
+        with self._condition:
+            while True:
+                if self._error is not None:
+                    raise self._error
+
+                #Positions reached, for the callback
+                while len(self._reached) > 0:
+                    position = self._reached.popleft()
+                    count += 1
+                    if self._callback is not None:
+                        self._condition.release()
+                        try:
+                            self._callback(count - 1, position)
+                        finally:
+                            self._condition.acquire()
+
+                if not exhausted and not self._stopping and len(self._frames) < self._prefetch:
+                    #Outside of the lock: the iterator may be slow
+                    self._condition.release()
+                    try:
+                        point = next(iterator, None)
+                        frame = None if point is None else self._encode(point)
+                    finally:
+                        self._condition.acquire()
+                    if frame is None:
+                        exhausted = True
+                    else:
+                        self._frames.append(frame)
+                    continue
+
+                if self._in_flight is None:
+                    if self._stopping or len(self._frames) == 0:
+                        break
+                    self._issue()
+                    continue
+
+                wait = None
+                if self.timeout is not None:
+                    wait = self.timeout - (time.perf_counter() - self._issue_time)
+                    if wait <= 0:
+                        in_flight = self._in_flight
+                        self._in_flight = None
+                        in_flight.cancel()
+                        raise TimeoutError("Move of {0!r} not completed".format(self._stage))
+                self._condition.wait(wait)
+
+        elapsed = 0 if self._start_time is None else self._end_time - self._start_time
+        return TrajectoryResult(points = count,
+                                elapsed = elapsed,
+                                points_per_second = count / elapsed if elapsed > 0 else 0,
+                                position = position)